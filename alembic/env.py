@@ -22,6 +22,10 @@ if config.config_file_name is not None:
 
 target_metadata = Base.metadata
 
+# Session-level limits applied to the migration connection
+LOCK_TIMEOUT = "5s"
+STATEMENT_TIMEOUT = "15min"
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
@@ -31,6 +35,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
@@ -38,7 +43,21 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # Fail fast instead of queueing behind long-running transactions, and
+    # bound any single statement so a deploy can never hang indefinitely.
+    connection.exec_driver_sql(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+    connection.exec_driver_sql(f"SET statement_timeout = '{STATEMENT_TIMEOUT}'")
+    # The SETs autobegan a transaction; commit it (session-level settings
+    # persist) so Alembic owns the transactions and autocommit_block() works.
+    connection.commit()
+
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # Each migration gets its own transaction so autocommit_block()
+        # (needed for CREATE INDEX CONCURRENTLY) can step outside of it.
+        transaction_per_migration=True,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -18,60 +18,91 @@ branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
 
-def upgrade() -> None:
-    # Drop existing tables and recreate with new schema (dev only)
-    op.drop_table('generated_images')
-    op.drop_table('users')
+# Legacy single-image columns replaced by reference_image_keys
+LEGACY_COLUMNS = (
+    'face_image_key',
+    'upper_body_image_key',
+    'full_image_key',
+    'facial_attributes',
+    'face_embedding',
+    'face_quality_score',
+    'face_detection_confidence',
+    'original_images_count',
+)
+
+# Rows updated per backfill statement
+BACKFILL_BATCH_SIZE = 1000
+
 
-    # Create users table with new simplified schema
-    op.create_table(
+def upgrade() -> None:
+    # Add the new column alongside the legacy ones so existing rows survive.
+    # generated_images is unchanged by this revision and is left as is.
+    op.add_column(
         'users',
-        sa.Column('id', sa.String(36), primary_key=True),
-        sa.Column('name', sa.String(255), nullable=False),
-        sa.Column('reference_image_keys', sa.JSON(), nullable=False, default=[]),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
-        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column(
+            'reference_image_keys',
+            postgresql.JSONB(),
+            nullable=False,
+            server_default=sa.text("'[]'::jsonb"),
+        ),
     )
 
-    # Recreate generated_images table
-    op.create_table(
-        'generated_images',
-        sa.Column('id', sa.String(36), primary_key=True),
-        sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
-        sa.Column('prompt', sa.Text(), nullable=False),
-        sa.Column('image_s3_key', sa.String(512), nullable=False),
-        sa.Column('image_url', sa.Text(), nullable=True),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
-    )
+    # Backfill from the legacy image keys in keyset-paginated batches
+    # (id > last_id, O(1) per page unlike OFFSET). Each UPDATE commits on
+    # its own so row locks and WAL stay bounded per batch.
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = ''
+        while True:
+            rows = connection.execute(
+                sa.text("SELECT id FROM users WHERE id > :last_id ORDER BY id LIMIT :batch_size"),
+                {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
 
+            ids = [row.id for row in rows]
+            connection.execute(
+                sa.text(
+                    "UPDATE users "
+                    "SET reference_image_keys = to_jsonb(array_remove("
+                    "ARRAY[face_image_key, upper_body_image_key, full_image_key], NULL)) "
+                    "WHERE id = ANY(:ids)"
+                ),
+                {"ids": ids},
+            )
+            last_id = ids[-1]
+
+    # Drop the obsolete columns only once the data has been carried over
+    for column in LEGACY_COLUMNS:
+        op.drop_column('users', column)
 
-def downgrade() -> None:
-    # Drop and recreate with old schema
-    op.drop_table('generated_images')
-    op.drop_table('users')
 
-    op.create_table(
+def downgrade() -> None:
+    # Restore the legacy columns, then repopulate them from the array
+    op.add_column('users', sa.Column('face_image_key', sa.String(512), nullable=True))
+    op.add_column('users', sa.Column('upper_body_image_key', sa.String(512), nullable=True))
+    op.add_column('users', sa.Column('full_image_key', sa.String(512), nullable=True))
+    op.add_column('users', sa.Column('facial_attributes', sa.JSON(), nullable=True))
+    # Restored as JSON to match the legacy schema exactly. If face embeddings
+    # come back as a feature, store them as a pgvector VECTOR(512) with an
+    # HNSW (vector_cosine_ops) index instead: JSON vectors can only be
+    # compared by decoding every row in Python.
+    op.add_column('users', sa.Column('face_embedding', sa.JSON(), nullable=True))
+    op.add_column('users', sa.Column('face_quality_score', sa.Float(), nullable=True))
+    op.add_column('users', sa.Column('face_detection_confidence', sa.Float(), nullable=True))
+    op.add_column(
         'users',
-        sa.Column('id', sa.String(36), primary_key=True),
-        sa.Column('name', sa.String(255), nullable=False),
-        sa.Column('face_image_key', sa.String(512), nullable=False),
-        sa.Column('upper_body_image_key', sa.String(512), nullable=True),
-        sa.Column('full_image_key', sa.String(512), nullable=True),
-        sa.Column('facial_attributes', sa.JSON(), nullable=True),
-        sa.Column('face_embedding', sa.JSON(), nullable=True),
-        sa.Column('face_quality_score', sa.Float(), nullable=True),
-        sa.Column('face_detection_confidence', sa.Float(), nullable=True),
-        sa.Column('original_images_count', sa.Integer(), nullable=False),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
-        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('original_images_count', sa.Integer(), nullable=False, server_default='0'),
     )
 
-    op.create_table(
-        'generated_images',
-        sa.Column('id', sa.String(36), primary_key=True),
-        sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
-        sa.Column('prompt', sa.Text(), nullable=False),
-        sa.Column('image_s3_key', sa.String(512), nullable=False),
-        sa.Column('image_url', sa.Text(), nullable=True),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
+    op.execute(
+        "UPDATE users SET "
+        "face_image_key = COALESCE(reference_image_keys->>0, ''), "
+        "upper_body_image_key = reference_image_keys->>1, "
+        "full_image_key = reference_image_keys->>2, "
+        "original_images_count = jsonb_array_length(reference_image_keys)"
     )
+    op.alter_column('users', 'face_image_key', nullable=False)
+
+    op.drop_column('users', 'reference_image_keys')
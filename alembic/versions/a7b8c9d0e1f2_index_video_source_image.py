@@ -0,0 +1,34 @@
+"""partial index on generated_videos.source_image_id
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-03-10 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.migration_ops import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Deleting a generated image runs ON DELETE SET NULL against
+    # generated_videos.source_image_id. Most videos come from text and have
+    # no source image, so indexing only the non-null rows keeps it small.
+    with op.get_context().autocommit_block():
+        create_index_concurrently(
+            "ix_videos_source_image",
+            "ON generated_videos (source_image_id) WHERE source_image_id IS NOT NULL",
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_videos_source_image")
@@ -10,6 +10,8 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 
+from app.migration_ops import create_index_concurrently
+
 # revision identifiers, used by Alembic.
 revision: str = 'a1b2c3d4e5f6'
 down_revision: Union[str, None] = '599b6b884a1a'
@@ -32,8 +34,11 @@ def upgrade() -> None:
         sa.Column('created_at', sa.DateTime(), nullable=False),
     )
 
-    # Create index on user_id for faster queries
-    op.create_index('ix_generated_videos_user_id', 'generated_videos', ['user_id'])
+    # Create index on user_id for faster queries.
+    # Built CONCURRENTLY (outside the migration transaction) to avoid
+    # holding a write lock on the table while the index is created
+    with op.get_context().autocommit_block():
+        create_index_concurrently('ix_generated_videos_user_id', 'ON generated_videos (user_id)')
 
 
 def downgrade() -> None:
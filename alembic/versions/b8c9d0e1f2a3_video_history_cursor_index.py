@@ -0,0 +1,40 @@
+"""add id to the generated_videos history index
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-03-11 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.migration_ops import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c9d0e1f2a3'
+down_revision: Union[str, None] = 'a7b8c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The video history cursor is (created_at, id), so the composite index
+    # gains id as a trailing column to serve the row-comparison predicate and
+    # the tiebreak ordering. The new index is built before the old one is
+    # dropped so history queries stay indexed throughout.
+    with op.get_context().autocommit_block():
+        create_index_concurrently(
+            "ix_generated_videos_user_id_created_at_id",
+            "ON generated_videos (user_id, created_at DESC, id DESC)",
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_generated_videos_user_id_created_at")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        create_index_concurrently(
+            "ix_generated_videos_user_id_created_at",
+            "ON generated_videos (user_id, created_at DESC)",
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_generated_videos_user_id_created_at_id")
@@ -0,0 +1,57 @@
+"""add (user_id, created_at) history indexes
+
+Revision ID: c3d4e5f6a7b8
+Revises: b7c8d9e0f1a2
+Create Date: 2026-03-02 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.migration_ops import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, None] = 'b7c8d9e0f1a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # History endpoints filter by user_id and sort by created_at DESC, so a
+    # composite index serves both the filter and the ordering. Built
+    # CONCURRENTLY so live tables are not locked against writes.
+    with op.get_context().autocommit_block():
+        create_index_concurrently(
+            "ix_generated_images_user_id_created_at",
+            "ON generated_images (user_id, created_at DESC)",
+        )
+        create_index_concurrently(
+            "ix_generated_videos_user_id_created_at",
+            "ON generated_videos (user_id, created_at DESC)",
+        )
+        create_index_concurrently(
+            "ix_generated_tryons_user_id_created_at",
+            "ON generated_tryons (user_id, created_at DESC)",
+        )
+
+        # The composite indexes cover user_id lookups on their own
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_generated_videos_user_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_generated_tryons_user_id")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        create_index_concurrently(
+            "ix_generated_videos_user_id",
+            "ON generated_videos (user_id)",
+        )
+        create_index_concurrently(
+            "ix_generated_tryons_user_id",
+            "ON generated_tryons (user_id)",
+        )
+
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_generated_images_user_id_created_at")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_generated_videos_user_id_created_at")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_generated_tryons_user_id_created_at")
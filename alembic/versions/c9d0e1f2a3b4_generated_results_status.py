@@ -0,0 +1,36 @@
+"""add status to generated_images and generated_tryons
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-03-12 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d0e1f2a3b4'
+down_revision: Union[str, None] = 'b8c9d0e1f2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUS_TABLES = ('generated_images', 'generated_tryons')
+
+
+def upgrade() -> None:
+    # Rows are now inserted as "pending" before the background upload runs.
+    # Existing rows were only inserted after a successful upload, so they
+    # default to "completed"; a constant default adds the column without a
+    # table rewrite.
+    for table in STATUS_TABLES:
+        op.add_column(
+            table,
+            sa.Column('status', sa.String(20), nullable=False, server_default='completed'),
+        )
+
+
+def downgrade() -> None:
+    for table in STATUS_TABLES:
+        op.drop_column(table, 'status')
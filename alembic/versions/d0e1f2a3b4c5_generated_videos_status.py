@@ -0,0 +1,30 @@
+"""add status to generated_videos
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-03-12 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0e1f2a3b4c5'
+down_revision: Union[str, None] = 'c9d0e1f2a3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Videos are now inserted as "pending" before the background upload runs;
+    # existing rows were only inserted once stored
+    op.add_column(
+        'generated_videos',
+        sa.Column('status', sa.String(20), nullable=False, server_default='completed'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('generated_videos', 'status')
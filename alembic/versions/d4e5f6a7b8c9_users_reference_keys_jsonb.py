@@ -0,0 +1,49 @@
+"""store users.reference_image_keys as JSONB with a GIN index
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-03-04 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.migration_ops import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables created through create_all still use json; no-op for jsonb
+    op.alter_column(
+        'users',
+        'reference_image_keys',
+        type_=postgresql.JSONB(),
+        postgresql_using='reference_image_keys::jsonb',
+    )
+
+    # jsonb_path_ops keeps the index small and serves @> containment lookups
+    with op.get_context().autocommit_block():
+        create_index_concurrently(
+            "ix_users_ref_keys",
+            "ON users USING GIN (reference_image_keys jsonb_path_ops)",
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_ref_keys")
+
+    op.alter_column(
+        'users',
+        'reference_image_keys',
+        type_=sa.JSON(),
+        postgresql_using='reference_image_keys::json',
+    )
@@ -0,0 +1,56 @@
+"""server-side timestamp defaults with time zone
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-03-06 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TIMESTAMP_COLUMNS = (
+    ('users', 'created_at'),
+    ('users', 'updated_at'),
+    ('generated_images', 'created_at'),
+    ('generated_videos', 'created_at'),
+    ('generated_tryons', 'created_at'),
+)
+
+
+def upgrade() -> None:
+    # Existing values were written with datetime.utcnow(). With the session
+    # time zone at UTC they are read as UTC, and PostgreSQL 12+ converts
+    # timestamp -> timestamptz without rewriting the table.
+    op.execute("SET LOCAL TIME ZONE 'UTC'")
+
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.DateTime(timezone=True),
+            existing_type=sa.DateTime(),
+            server_default=sa.func.now(),
+            existing_nullable=False,
+        )
+
+
+def downgrade() -> None:
+    op.execute("SET LOCAL TIME ZONE 'UTC'")
+
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.DateTime(),
+            existing_type=sa.DateTime(timezone=True),
+            server_default=None,
+            existing_nullable=False,
+        )
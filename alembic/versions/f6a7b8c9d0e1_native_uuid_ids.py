@@ -0,0 +1,62 @@
+"""store ids as native uuid instead of varchar(36)
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-03-09 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a7b8c9d0e1'
+down_revision: Union[str, None] = 'e5f6a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (constraint, table, column, referred table, ondelete) — PostgreSQL's
+# default names for the unnamed foreign keys created by earlier revisions
+FOREIGN_KEYS = (
+    ('generated_images_user_id_fkey', 'generated_images', 'user_id', 'users', 'CASCADE'),
+    ('generated_videos_user_id_fkey', 'generated_videos', 'user_id', 'users', 'CASCADE'),
+    ('generated_videos_source_image_id_fkey', 'generated_videos', 'source_image_id', 'generated_images', 'SET NULL'),
+    ('generated_tryons_user_id_fkey', 'generated_tryons', 'user_id', 'users', 'CASCADE'),
+)
+
+ID_COLUMNS = (
+    ('users', 'id'),
+    ('generated_images', 'id'),
+    ('generated_images', 'user_id'),
+    ('generated_videos', 'id'),
+    ('generated_videos', 'user_id'),
+    ('generated_videos', 'source_image_id'),
+    ('generated_tryons', 'id'),
+    ('generated_tryons', 'user_id'),
+)
+
+
+def _convert(type_, using: str) -> None:
+    # Foreign keys must be dropped while both sides change type.
+    # Note: ALTER COLUMN TYPE rewrites each table (and its indexes) under an
+    # ACCESS EXCLUSIVE lock, so run this in a maintenance window.
+    for name, table, _, _, _ in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+
+    for table, column in ID_COLUMNS:
+        op.alter_column(table, column, type_=type_, postgresql_using=f'{column}::{using}')
+
+    for name, table, column, referred, ondelete in FOREIGN_KEYS:
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    # 16-byte uuid keys instead of 36-byte strings shrink the primary key and
+    # every foreign-key / history index built on them
+    _convert(postgresql.UUID(as_uuid=False), 'uuid')
+
+
+def downgrade() -> None:
+    _convert(sa.String(36), 'varchar')
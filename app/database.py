@@ -1,5 +1,7 @@
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from uuid_utils.compat import uuid7
 
 from app.config import get_settings
 
@@ -9,6 +11,23 @@ engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
     pool_pre_ping=True,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    connect_args={
+        # asyncpg's own statement cache and SQLAlchemy's prepared statement
+        # cache both default to 100, which the ORM's statement shapes outgrow
+        "statement_cache_size": 1024,
+        "prepared_statement_cache_size": 1024,
+        # JIT planning costs more than it saves on short OLTP queries
+        "server_settings": {"jit": "off"},
+    },
+    # Room for every distinct ORM statement shape in the compiled cache
+    query_cache_size=1200,
+    # JSONB columns (reference_image_keys) round-trip through orjson;
+    # SQLAlchemy expects the serializer to return str
+    json_serializer=lambda value: orjson.dumps(value).decode(),
+    json_deserializer=orjson.loads,
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -18,8 +37,15 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+def new_uuid() -> str:
+    """Time-ordered UUIDv7 string for primary keys, assigned in Python."""
+    return str(uuid7())
+
+
 class Base(DeclarativeBase):
-    pass
+    # Fetch server-generated values (timestamps) via RETURNING during the
+    # flush, so they never need a lazy refresh under AsyncSession
+    __mapper_args__ = {"eager_defaults": True}
 
 
 async def get_db() -> AsyncSession:
@@ -0,0 +1,32 @@
+import hashlib
+
+from fastapi import Request, Response, status
+
+# Clients may reuse a response briefly, then revalidate it with If-None-Match
+CACHE_CONTROL = "private, max-age=10"
+
+
+def compute_etag(*parts: object) -> str:
+    """Build a strong ETag from the values that determine a response body."""
+    digest = hashlib.blake2b(
+        ":".join(str(part) for part in parts).encode(), digest_size=8
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Attach caching headers to the response.
+    Returns a 304 response when the client's If-None-Match already holds the
+    ETag, so the handler can skip building the body.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -1,32 +1,88 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
-from pathlib import Path
+import orjson
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.config import get_settings
 from app.database import engine, Base
 from app.routers import users, generation, video, tryon
+from app.services.genai_client import warm_up_genai_client
 from app.services.storage import storage
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Startup schema/storage setup is retried this many times, with exponential
+# backoff, before the app reports itself as failed
+STARTUP_ATTEMPTS = 5
+STARTUP_RETRY_BASE_DELAY = 2.0
+
+# The / and /health payloads never change, so they are encoded once here
+# instead of on every request.
+_ROOT_BYTES = orjson.dumps({
+    "service": settings.app_name,
+    "version": "1.0.0",
+    "docs": "/docs",
+    "endpoints": {
+        "register_user": "POST /api/v1/users/register",
+        "get_user": "GET /api/v1/users/{user_id}",
+        "generate_image": "POST /api/v1/generate",
+        "image_history": "GET /api/v1/generate/history/{user_id}",
+        "generate_video_from_text": "POST /api/v1/video/from-text",
+        "generate_video_from_image": "POST /api/v1/video/from-image",
+        "video_history": "GET /api/v1/video/history/{user_id}",
+        "virtual_tryon": "POST /api/v1/tryon",
+        "tryon_history": "GET /api/v1/tryon/history/{user_id}",
+    }
+})
+_HEALTH_BYTES = orjson.dumps({"status": "healthy", "service": settings.app_name})
+_INITIALIZING_BYTES = orjson.dumps({"status": "initializing", "service": settings.app_name})
+_FAILED_BYTES = orjson.dumps({"status": "failed", "service": settings.app_name})
+
+
+async def _run_migrations(app: FastAPI) -> None:
+    """
+    Create database tables and storage directories, then mark the app as ready.
+    Failures (e.g. the database not reachable yet) are logged and retried; once
+    the attempts run out, /health reports "failed" so the orchestrator restarts us.
+    """
+    for attempt in range(STARTUP_ATTEMPTS):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            await storage.ensure_storage_exists()
+        except Exception:
+            logger.exception("Startup setup failed (attempt %d/%d)", attempt + 1, STARTUP_ATTEMPTS)
+            if attempt == STARTUP_ATTEMPTS - 1:
+                app.state.startup_failed = True
+                return
+            await asyncio.sleep(STARTUP_RETRY_BASE_DELAY * 2 ** attempt)
+        else:
+            app.state.migrations_ready.set()
+            return
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     # Startup
-    # Create database tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    # Ensure local storage directories exist
-    await storage.ensure_storage_exists()
+    # Schema sync and storage setup run in the background so the server
+    # starts accepting connections immediately; /health reports 503 until
+    # they complete.
+    app.state.migrations_ready = asyncio.Event()
+    app.state.startup_failed = False
+    migrations_task = asyncio.create_task(_run_migrations(app))
+    warm_up_task = asyncio.create_task(warm_up_genai_client())
 
     yield
 
     # Shutdown
+    migrations_task.cancel()
+    warm_up_task.cancel()
     await engine.dispose()
 
 
@@ -75,21 +131,33 @@ app = FastAPI(
     """,
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# CORS middleware
+# CORS middleware. An explicit origin allowlist is matched with a set lookup;
+# credentials are only allowed with an allowlist, since browsers reject them
+# for a wildcard origin anyway.
+allow_any_origin = "*" in settings.cors_allow_origins
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
-    allow_credentials=True,
-    allow_methods=["*"],
+    allow_origins=settings.cors_allow_origins,
+    allow_credentials=not allow_any_origin,
+    allow_methods=["GET", "POST", "DELETE"],
     allow_headers=["*"],
+    # Let browser clients read the pagination cursor
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Mount static files for serving stored images
-storage_path = Path(settings.storage_path)
-storage_path.mkdir(parents=True, exist_ok=True)
-app.mount("/files", StaticFiles(directory=str(storage_path)), name="files")
+# Serve stored files from the API only when no external file server is
+# configured. In production, point STORAGE_PUBLIC_BASE_URL at a CDN or an
+# nginx location with sendfile so media bytes never pass through Python.
+# The directory is created by the startup task, so it is not checked here.
+if not settings.storage_public_base_url:
+    app.mount(
+        "/files",
+        StaticFiles(directory=str(settings.storage_path), check_dir=False),
+        name="files",
+    )
 
 
 # Global exception handler
@@ -112,27 +180,16 @@ app.include_router(tryon.router, prefix="/api/v1")
 
 
 @app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy", "service": settings.app_name}
+async def health_check(request: Request):
+    """Health check endpoint. Returns 503 until startup migrations finish, or if they failed."""
+    if request.app.state.startup_failed:
+        return Response(_FAILED_BYTES, status_code=503, media_type="application/json")
+    if not request.app.state.migrations_ready.is_set():
+        return Response(_INITIALIZING_BYTES, status_code=503, media_type="application/json")
+    return Response(_HEALTH_BYTES, media_type="application/json")
 
 
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
-    return {
-        "service": settings.app_name,
-        "version": "1.0.0",
-        "docs": "/docs",
-        "endpoints": {
-            "register_user": "POST /api/v1/users/register",
-            "get_user": "GET /api/v1/users/{user_id}",
-            "generate_image": "POST /api/v1/generate",
-            "image_history": "GET /api/v1/generate/history/{user_id}",
-            "generate_video_from_text": "POST /api/v1/video/from-text",
-            "generate_video_from_image": "POST /api/v1/video/from-image",
-            "video_history": "GET /api/v1/video/history/{user_id}",
-            "virtual_tryon": "POST /api/v1/tryon",
-            "tryon_history": "GET /api/v1/tryon/history/{user_id}",
-        }
-    }
+    return Response(_ROOT_BYTES, media_type="application/json")
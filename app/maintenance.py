@@ -0,0 +1,37 @@
+"""
+Maintenance jobs that are too slow for the request path or startup.
+Run them from cron or a one-off container, e.g.:
+
+    python -m app.maintenance prune-blobs
+"""
+import argparse
+import asyncio
+import logging
+
+from app.services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+async def prune_blobs() -> None:
+    """Delete stored blobs that no file links to any more."""
+    pruned = await storage.prune_blobs()
+    logger.info("Pruned %d unreferenced blobs from %s", pruned, storage.blob_path)
+
+
+JOBS = {
+    "prune-blobs": prune_blobs,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a maintenance job.")
+    parser.add_argument("job", choices=sorted(JOBS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(JOBS[args.job]())
+
+
+if __name__ == "__main__":
+    main()
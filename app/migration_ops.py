@@ -0,0 +1,23 @@
+from alembic import op
+from sqlalchemy import text
+
+
+def create_index_concurrently(name: str, definition: str) -> None:
+    """
+    Run ``CREATE INDEX CONCURRENTLY IF NOT EXISTS <name> <definition>``.
+    Call it inside ``op.get_context().autocommit_block()``.
+
+    A concurrent build that fails or hits lock_timeout/statement_timeout
+    leaves an INVALID index under the same name, which IF NOT EXISTS would
+    then skip on the next run, marking the revision applied with an unusable
+    index. Such a leftover is dropped first so the rerun rebuilds it.
+    """
+    # Offline (--sql) mode has no connection to inspect
+    if not op.get_context().as_sql:
+        invalid = op.get_bind().scalar(
+            text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+            {"name": name},
+        )
+        if invalid:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
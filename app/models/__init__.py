@@ -1,6 +1,7 @@
+from app.models.status import PersistStatus
 from app.models.user import User
 from app.models.generated_image import GeneratedImage
 from app.models.generated_video import GeneratedVideo
 from app.models.generated_tryon import GeneratedTryon
 
-__all__ = ["User", "GeneratedImage", "GeneratedVideo", "GeneratedTryon"]
+__all__ = ["PersistStatus", "User", "GeneratedImage", "GeneratedVideo", "GeneratedTryon"]
@@ -1,21 +1,22 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, Text, ForeignKey
+from sqlalchemy import String, DateTime, Text, ForeignKey, Index, func
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from uuid_extension import uuid7
 
-from app.database import Base
+from app.database import Base, new_uuid
+from app.models.status import PersistStatus
 
 
 class GeneratedImage(Base):
     __tablename__ = "generated_images"
 
     id: Mapped[str] = mapped_column(
-        String(36), primary_key=True, default=lambda: str(uuid7())
+        UUID(as_uuid=False), primary_key=True, default=new_uuid
     )
 
     # Foreign key to user
     user_id: Mapped[str] = mapped_column(
-        String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
 
     # The prompt used for generation
@@ -25,9 +26,15 @@ class GeneratedImage(Base):
     image_s3_key: Mapped[str] = mapped_column(String(512), nullable=False)
     image_url: Mapped[str] = mapped_column(Text, nullable=True)
 
+    # pending until the background upload finishes; rows from before the
+    # column existed were only written once stored
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, server_default=PersistStatus.COMPLETED.value
+    )
+
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # Relationship back to user
@@ -35,3 +42,11 @@ class GeneratedImage(Base):
 
     def __repr__(self) -> str:
         return f"<GeneratedImage(id={self.id}, user_id={self.user_id})>"
+
+
+# History queries filter by user and sort newest first
+Index(
+    "ix_generated_images_user_id_created_at",
+    GeneratedImage.user_id,
+    GeneratedImage.created_at.desc(),
+)
@@ -1,21 +1,22 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, Text, ForeignKey, Float
+from sqlalchemy import String, DateTime, Text, ForeignKey, Float, Index, func
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from uuid_extension import uuid7
 
-from app.database import Base
+from app.database import Base, new_uuid
+from app.models.status import PersistStatus
 
 
 class GeneratedVideo(Base):
     __tablename__ = "generated_videos"
 
     id: Mapped[str] = mapped_column(
-        String(36), primary_key=True, default=lambda: str(uuid7())
+        UUID(as_uuid=False), primary_key=True, default=new_uuid
     )
 
     # Foreign key to user
     user_id: Mapped[str] = mapped_column(
-        String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
 
     # The prompt used for generation
@@ -30,15 +31,21 @@ class GeneratedVideo(Base):
 
     # Optional reference to source image (for image-to-video)
     source_image_id: Mapped[str | None] = mapped_column(
-        String(36), ForeignKey("generated_images.id", ondelete="SET NULL"), nullable=True
+        UUID(as_uuid=False), ForeignKey("generated_images.id", ondelete="SET NULL"), nullable=True
     )
 
     # Video metadata
     duration_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
 
+    # pending until the background upload finishes; rows from before the
+    # column existed were only written once stored
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, server_default=PersistStatus.COMPLETED.value
+    )
+
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # Relationships
@@ -49,3 +56,19 @@ class GeneratedVideo(Base):
 
     def __repr__(self) -> str:
         return f"<GeneratedVideo(id={self.id}, user_id={self.user_id}, source_type={self.source_type})>"
+
+
+# History queries filter by user and sort newest first; id is the cursor tiebreaker
+Index(
+    "ix_generated_videos_user_id_created_at_id",
+    GeneratedVideo.user_id,
+    GeneratedVideo.created_at.desc(),
+    GeneratedVideo.id.desc(),
+)
+
+# Serves ON DELETE SET NULL from generated_images; text videos have no source
+Index(
+    "ix_videos_source_image",
+    GeneratedVideo.source_image_id,
+    postgresql_where=GeneratedVideo.source_image_id.isnot(None),
+)
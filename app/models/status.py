@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class PersistStatus(str, Enum):
+    """
+    Storage state of a generated result. Rows are written as pending before
+    the response is sent and updated once the background upload finishes.
+    """
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
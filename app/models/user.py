@@ -1,44 +1,59 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, JSON
+from sqlalchemy import String, DateTime, Index, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from uuid_extension import uuid7
 
-from app.database import Base
+from app.database import Base, new_uuid
 
 
 class User(Base):
     __tablename__ = "users"
 
     id: Mapped[str] = mapped_column(
-        String(36), primary_key=True, default=lambda: str(uuid7())
+        UUID(as_uuid=False), primary_key=True, default=new_uuid
     )
     name: Mapped[str] = mapped_column(String(255), nullable=False)
 
-    # Reference images stored as JSON array of storage keys
+    # Reference images stored as a JSONB array of storage keys
     # e.g., ["users/abc123/image_0.jpg", "users/abc123/image_1.jpg"]
-    reference_image_keys: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    reference_image_keys: Mapped[list] = mapped_column(JSONB, nullable=False, default=list)
 
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
     )
 
+    # passive_deletes: rely on the ON DELETE CASCADE foreign keys rather than
+    # loading every child row into the session when a user is deleted
+
     # Relationship to generated images
     generated_images: Mapped[list["GeneratedImage"]] = relationship(
-        "GeneratedImage", back_populates="user", cascade="all, delete-orphan"
+        "GeneratedImage",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
     # Relationship to generated videos
     generated_videos: Mapped[list["GeneratedVideo"]] = relationship(
-        "GeneratedVideo", back_populates="user", cascade="all, delete-orphan"
+        "GeneratedVideo",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
     # Relationship to generated try-ons
     generated_tryons: Mapped[list["GeneratedTryon"]] = relationship(
-        "GeneratedTryon", back_populates="user", cascade="all, delete-orphan"
+        "GeneratedTryon",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
     def get_reference_key(self) -> str | None:
@@ -47,5 +62,19 @@ class User(Base):
             return None
         return self.reference_image_keys[0]
 
+    @property
+    def images_count(self) -> int:
+        """Number of reference images, derived from reference_image_keys."""
+        return len(self.reference_image_keys or ())
+
     def __repr__(self) -> str:
         return f"<User(id={self.id}, name={self.name})>"
+
+
+# Containment lookups on reference keys (e.g. which user owns a storage key)
+Index(
+    "ix_users_ref_keys",
+    User.reference_image_keys,
+    postgresql_using="gin",
+    postgresql_ops={"reference_image_keys": "jsonb_path_ops"},
+)
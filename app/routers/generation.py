@@ -1,19 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select
+from sqlalchemy.orm import load_only
 
-from app.database import get_db
-from app.models import User, GeneratedImage
+from app.database import get_db, new_uuid
+from app.http_cache import compute_etag, not_modified
+from app.models import User, GeneratedImage, PersistStatus
 from app.schemas import GenerateImageRequest, GenerateImageResponse, GeneratedImageInfo
+from app.schemas.common import UUIDStr
 from app.services.imagen import imagen_service
+from app.services.persistence import set_persist_status
 from app.services.storage import storage
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/generate", tags=["generation"])
 
 
-@router.post("", response_model=GenerateImageResponse)
+async def _persist_generated_images(
+    rows: list[dict],
+    image_bytes_list: list[bytes],
+) -> None:
+    """
+    Upload generated images, then mark their pending rows completed.
+    Storage already retries transient errors; if an upload still fails, the
+    files that did land are removed and the rows are marked failed, so the
+    history reports the loss instead of serving URLs that 404.
+    """
+    keys = [row["image_s3_key"] for row in rows]
+    try:
+        await asyncio.gather(*(
+            storage.upload_image(image_bytes, key, content_type="image/jpeg")
+            for key, image_bytes in zip(keys, image_bytes_list)
+        ))
+    except Exception:
+        logger.exception(
+            "Failed to store generated images %s", [row["id"] for row in rows]
+        )
+        await storage.delete_images(keys)
+        outcome = PersistStatus.FAILED
+    else:
+        outcome = PersistStatus.COMPLETED
+
+    await set_persist_status(GeneratedImage, [row["id"] for row in rows], outcome)
+
+
+@router.post(
+    "",
+    response_model=GenerateImageResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def generate_image(
     request: GenerateImageRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -23,7 +63,9 @@ async def generate_image(
     1. Fetch the user's best reference image
     2. Send it to Nano Banana with your prompt
     3. Generate an image preserving the person's facial features
-    4. Store and return the generated image
+    4. Return the generated image; storing it finishes in the background,
+       and its ``status`` in the history turns from pending to completed
+       (or failed)
 
     Example prompts:
     - "enjoying at a beach with sunset"
@@ -34,8 +76,7 @@ async def generate_image(
     - "cooking in a kitchen"
     """
     # Get user
-    result = await db.execute(select(User).where(User.id == request.user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, request.user_id)
 
     if user is None:
         raise HTTPException(
@@ -43,6 +84,10 @@ async def generate_image(
             detail=f"User with ID {request.user_id} not found. Please register first."
         )
 
+    # Return the connection to the pool before storage I/O and inference;
+    # the loaded user stays readable, and the pending INSERT checks one out again
+    await db.close()
+
     # Load ALL reference images — more angles = stronger face lock
     reference_keys = user.reference_image_keys or []
     if not reference_keys:
@@ -51,23 +96,20 @@ async def generate_image(
             detail="No reference image found for user."
         )
 
-    # Load primary reference (first image)
-    try:
-        reference_image = await storage.download_image(reference_keys[0])
-    except Exception as e:
+    # Load all references concurrently; only the primary one is required
+    downloads = await asyncio.gather(
+        *(storage.download_image(key) for key in reference_keys),
+        return_exceptions=True,
+    )
+    reference_image = downloads[0]
+    if isinstance(reference_image, Exception):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to retrieve reference image: {str(e)}"
+            detail=f"Failed to retrieve reference image: {str(reference_image)}"
         )
 
-    # Load additional references for multi-angle face anchoring
-    additional_references = []
-    for key in reference_keys[1:]:
-        try:
-            img_bytes = await storage.download_image(key)
-            additional_references.append(img_bytes)
-        except Exception:
-            continue  # Skip failed loads
+    # Additional references for multi-angle face anchoring; skip failed loads
+    additional_references = [img for img in downloads[1:] if not isinstance(img, Exception)]
 
     # Generate image with reference(s)
     try:
@@ -90,65 +132,75 @@ async def generate_image(
             detail="No images were generated. Please try again with a different prompt."
         )
 
-    # Store generated images and create database records
-    generated_images_info = []
+    # Ids, keys and URLs are allocated up front and the rows are written as
+    # pending, so the response can be sent now; the uploads run after it as a
+    # background task that settles the status
+    image_ids = [new_uuid() for _ in generated_image_bytes_list]
+    storage_keys = [f"generated/{user.id}/{image_id}.jpg" for image_id in image_ids]
+    image_urls = await asyncio.gather(*(storage.get_url(key) for key in storage_keys))
+
+    rows = [
+        {
+            "id": image_id,
+            "user_id": user.id,
+            "prompt": request.prompt,
+            "image_s3_key": storage_key,
+            "image_url": image_url,
+            "status": PersistStatus.PENDING.value,
+        }
+        for image_id, storage_key, image_url in zip(image_ids, storage_keys, image_urls)
+    ]
+
+    # One bulk INSERT covers all rows. created_at comes from the database
+    # clock (server default), the same value for every row of the statement,
+    # so history order never depends on app server clocks.
+    created_at = (
+        await db.scalars(insert(GeneratedImage).returning(GeneratedImage.created_at), rows)
+    ).first()
+    await db.commit()
+    background_tasks.add_task(_persist_generated_images, rows, generated_image_bytes_list)
 
-    for i, image_bytes in enumerate(generated_image_bytes_list):
-        # Create database record
-        generated_image = GeneratedImage(
-            user_id=user.id,
+    generated_images_info = [
+        GeneratedImageInfo.model_construct(
+            id=row["id"],
+            image_url=row["image_url"],
             prompt=request.prompt,
-            image_s3_key="",
+            status=PersistStatus.PENDING,
+            created_at=created_at,
         )
-        db.add(generated_image)
-        await db.flush()
-
-        # Upload to storage
-        storage_key = f"generated/{user.id}/{generated_image.id}.jpg"
-        await storage.upload_image(image_bytes, storage_key, content_type="image/jpeg")
-
-        # Update record
-        generated_image.image_s3_key = storage_key
-        image_url = await storage.get_url(storage_key)
-        generated_image.image_url = image_url
-
-        generated_images_info.append(GeneratedImageInfo(
-            id=generated_image.id,
-            image_url=image_url,
-            prompt=request.prompt,
-            created_at=generated_image.created_at,
-        ))
-
-    await db.commit()
+        for row in rows
+    ]
 
     return GenerateImageResponse(
         user_id=user.id,
         prompt=request.prompt,
         images=generated_images_info,
+        message="Images generated successfully; they are being saved in the background",
     )
 
 
 @router.get("/history/{user_id}", response_model=list[GeneratedImageInfo])
 async def get_generation_history(
-    user_id: str,
+    user_id: UUIDStr,
+    request: Request,
+    response: Response,
     limit: int = 20,
     offset: int = 0,
     db: AsyncSession = Depends(get_db),
 ):
     """Get the generation history for a user."""
-    # Check if user exists
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with ID {user_id} not found."
-        )
-
-    # Get generated images
+    # Get generated images, loading only what the response needs; nothing
+    # on GeneratedImageInfo touches the user relationship
     result = await db.execute(
         select(GeneratedImage)
+        .options(load_only(
+            GeneratedImage.id,
+            GeneratedImage.prompt,
+            GeneratedImage.image_s3_key,
+            GeneratedImage.image_url,
+            GeneratedImage.status,
+            GeneratedImage.created_at,
+        ))
         .where(GeneratedImage.user_id == user_id)
         .order_by(GeneratedImage.created_at.desc())
         .offset(offset)
@@ -156,10 +208,30 @@ async def get_generation_history(
     )
     images = result.scalars().all()
 
-    # Build response with URLs
+    # Only an empty page needs a user lookup to tell 404 from no history
+    if not images and await db.scalar(select(User.id).where(User.id == user_id)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found."
+        )
+
+    # Only the status changes once a row is written, so ids and statuses
+    # identify the page contents. URLs resolved at read time depend on the
+    # public base URL, so a changed setting must invalidate cached pages too.
+    etag = compute_etag(
+        storage.public_base_url,
+        limit,
+        offset,
+        *(f"{row.id}/{row.status}" for row in images),
+    )
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+
+    # URLs are stored at write time; only resolve rows that lack one
     images_info = []
     for img in images:
-        if img.image_s3_key:
+        if img.image_s3_key and not img.image_url:
             img.image_url = await storage.get_url(img.image_s3_key)
         images_info.append(GeneratedImageInfo.model_validate(img))
 
@@ -1,24 +1,76 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+import asyncio
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select
+from sqlalchemy.orm import load_only
 from typing import Optional
 
-from app.database import get_db
-from app.models import User, GeneratedTryon
+from app.config import get_settings
+from app.database import get_db, new_uuid
+from app.http_cache import compute_etag, not_modified
+from app.models import User, GeneratedTryon, PersistStatus
 from app.schemas.tryon import (
     VirtualTryonResponse,
     GeneratedTryonInfo,
     TryonAspectRatio,
 )
+from app.schemas.common import UUIDStr
 from app.services.imagen import imagen_service
+from app.services.image_processing import InvalidImageError, validate_image
+from app.services.persistence import set_persist_status
 from app.services.storage import storage
 
+settings = get_settings()
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/tryon", tags=["virtual-tryon"])
 
+# Anything smaller is an empty or truncated upload
+MIN_CLOTHING_IMAGE_BYTES = 1000
 
-@router.post("", response_model=VirtualTryonResponse)
+
+async def _persist_tryons(
+    rows: list[dict],
+    clothing_bytes: bytes,
+    result_bytes_list: list[bytes],
+) -> None:
+    """
+    Upload clothing and result images, then mark the pending rows completed.
+    Storage already retries transient errors; if an upload still fails, the
+    files that did land are removed and the rows are marked failed, so the
+    history reports the loss instead of serving URLs that 404.
+    """
+    try:
+        await asyncio.gather(
+            *(
+                storage.upload_image(clothing_bytes, row["clothing_image_key"], content_type="image/jpeg")
+                for row in rows
+            ),
+            *(
+                storage.upload_image(image_bytes, row["result_image_key"], content_type="image/jpeg")
+                for row, image_bytes in zip(rows, result_bytes_list)
+            ),
+        )
+    except Exception:
+        logger.exception("Failed to store try-ons %s", [row["id"] for row in rows])
+        await storage.delete_images(
+            [key for row in rows for key in (row["clothing_image_key"], row["result_image_key"])]
+        )
+        outcome = PersistStatus.FAILED
+    else:
+        outcome = PersistStatus.COMPLETED
+
+    await set_persist_status(GeneratedTryon, [row["id"] for row in rows], outcome)
+
+
+@router.post(
+    "",
+    response_model=VirtualTryonResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def virtual_tryon(
-    user_id: str = Form(..., description="The user ID whose face/body to use"),
+    background_tasks: BackgroundTasks,
+    user_id: UUIDStr = Form(..., description="The user ID whose face/body to use"),
     clothing_image: UploadFile = File(
         ..., description="Photo of the clothing item to try on"
     ),
@@ -66,8 +118,7 @@ async def virtual_tryon(
     - Fashion design: Test designs on real body types
     """
     # ── Validate user ────────────────────────────────────────────────
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
 
     if user is None:
         raise HTTPException(
@@ -75,6 +126,10 @@ async def virtual_tryon(
             detail=f"User with ID {user_id} not found. Please register first.",
         )
 
+    # Return the connection to the pool before storage I/O and inference;
+    # the loaded user stays readable, and the pending INSERT checks one out again
+    await db.close()
+
     # ── Validate clothing image ──────────────────────────────────────
     if not clothing_image.content_type or not clothing_image.content_type.startswith(
         "image/"
@@ -84,13 +139,35 @@ async def virtual_tryon(
             detail="Uploaded file must be an image (JPEG, PNG, etc.)",
         )
 
+    # Reject by the parsed part size before pulling the file into memory
+    clothing_size = clothing_image.size
+    if clothing_size is not None and clothing_size > settings.max_clothing_image_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Clothing image exceeds {settings.max_clothing_image_bytes} bytes.",
+        )
+
+    if clothing_size is not None and clothing_size < MIN_CLOTHING_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Clothing image appears too small or corrupt.",
+        )
+
     clothing_bytes = await clothing_image.read()
-    if len(clothing_bytes) < 1000:
+    if len(clothing_bytes) < MIN_CLOTHING_IMAGE_BYTES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Clothing image appears too small or corrupt.",
         )
 
+    try:
+        await validate_image(clothing_bytes)
+    except InvalidImageError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Clothing image could not be read as an image.",
+        )
+
     # ── Load person reference images ─────────────────────────────────
     reference_keys = user.reference_image_keys or []
     if not reference_keys:
@@ -99,23 +176,20 @@ async def virtual_tryon(
             detail="No reference images found for user. Please upload reference photos first.",
         )
 
-    # Primary reference
-    try:
-        person_image = await storage.download_image(reference_keys[0])
-    except Exception as e:
+    # Load all references concurrently; only the primary one is required
+    downloads = await asyncio.gather(
+        *(storage.download_image(key) for key in reference_keys),
+        return_exceptions=True,
+    )
+    person_image = downloads[0]
+    if isinstance(person_image, Exception):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to load person reference image: {str(e)}",
+            detail=f"Failed to load person reference image: {str(person_image)}",
         )
 
-    # Additional references for stronger face anchoring
-    additional_refs = []
-    for key in reference_keys[1:]:
-        try:
-            img_bytes = await storage.download_image(key)
-            additional_refs.append(img_bytes)
-        except Exception:
-            continue
+    # Additional references for stronger face anchoring; skip failed loads
+    additional_refs = [img for img in downloads[1:] if not isinstance(img, Exception)]
 
     # ── Generate try-on ──────────────────────────────────────────────
     try:
@@ -140,77 +214,87 @@ async def virtual_tryon(
         )
 
     # ── Store results ────────────────────────────────────────────────
-    results = []
-
-    for i, image_bytes in enumerate(generated_images):
-        # Create DB record
-        tryon_record = GeneratedTryon(
-            user_id=user.id,
-            prompt=clothing_description,
-            clothing_image_key="",
-            result_image_key="",
+    # Ids, keys and URLs are allocated up front and the rows are written as
+    # pending, so the response can be sent now; the uploads run after it as a
+    # background task that settles the status
+    tryon_ids = [new_uuid() for _ in generated_images]
+    clothing_keys = [f"tryons/{user.id}/{tryon_id}_clothing.jpg" for tryon_id in tryon_ids]
+    result_keys = [f"tryons/{user.id}/{tryon_id}_result.jpg" for tryon_id in tryon_ids]
+    urls = await asyncio.gather(
+        *(storage.get_url(key) for key in clothing_keys + result_keys)
+    )
+    clothing_urls = urls[: len(clothing_keys)]
+    result_urls = urls[len(clothing_keys):]
+
+    rows = [
+        {
+            "id": tryon_id,
+            "user_id": user.id,
+            "prompt": clothing_description,
+            "clothing_image_key": clothing_key,
+            "clothing_image_url": clothing_url,
+            "result_image_key": result_key,
+            "result_image_url": result_url,
+            "status": PersistStatus.PENDING.value,
+        }
+        for tryon_id, clothing_key, result_key, clothing_url, result_url in zip(
+            tryon_ids, clothing_keys, result_keys, clothing_urls, result_urls
         )
-        db.add(tryon_record)
-        await db.flush()
-
-        # Store clothing image
-        clothing_key = f"tryons/{user.id}/{tryon_record.id}_clothing.jpg"
-        await storage.upload_image(clothing_bytes, clothing_key, content_type="image/jpeg")
-
-        # Store result image
-        result_key = f"tryons/{user.id}/{tryon_record.id}_result.jpg"
-        await storage.upload_image(image_bytes, result_key, content_type="image/jpeg")
-
-        # Update record with storage keys
-        tryon_record.clothing_image_key = clothing_key
-        tryon_record.result_image_key = result_key
-
-        clothing_url = await storage.get_url(clothing_key)
-        result_url = await storage.get_url(result_key)
-
-        tryon_record.clothing_image_url = clothing_url
-        tryon_record.result_image_url = result_url
+    ]
+
+    # One bulk INSERT covers all rows. created_at comes from the database
+    # clock (server default), the same value for every row of the statement,
+    # so history order never depends on app server clocks.
+    created_at = (
+        await db.scalars(insert(GeneratedTryon).returning(GeneratedTryon.created_at), rows)
+    ).first()
+    await db.commit()
+    background_tasks.add_task(_persist_tryons, rows, clothing_bytes, generated_images)
 
-        results.append(
-            GeneratedTryonInfo(
-                id=tryon_record.id,
-                clothing_image_url=clothing_url,
-                result_image_url=result_url,
-                prompt=clothing_description,
-                created_at=tryon_record.created_at,
-            )
+    results = [
+        GeneratedTryonInfo.model_construct(
+            id=row["id"],
+            clothing_image_url=row["clothing_image_url"],
+            result_image_url=row["result_image_url"],
+            prompt=clothing_description,
+            status=PersistStatus.PENDING,
+            created_at=created_at,
         )
-
-    await db.commit()
+        for row in rows
+    ]
 
     return VirtualTryonResponse(
         user_id=user.id,
         clothing_description=clothing_description,
         results=results,
+        message="Virtual try-on generated successfully; results are being saved in the background",
     )
 
 
 @router.get("/history/{user_id}", response_model=list[GeneratedTryonInfo])
 async def get_tryon_history(
-    user_id: str,
+    user_id: UUIDStr,
+    request: Request,
+    response: Response,
     limit: int = 20,
     offset: int = 0,
     db: AsyncSession = Depends(get_db),
 ):
     """Get the virtual try-on history for a user."""
-    # Check user exists
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with ID {user_id} not found.",
-        )
-
-    # Get try-on records
+    # Get try-on records, loading only what the response needs; nothing
+    # on GeneratedTryonInfo touches the user relationship
     result = await db.execute(
         select(GeneratedTryon)
+        .options(load_only(
+            GeneratedTryon.id,
+            GeneratedTryon.prompt,
+            GeneratedTryon.clothing_image_key,
+            GeneratedTryon.clothing_image_url,
+            GeneratedTryon.result_image_key,
+            GeneratedTryon.result_image_url,
+            GeneratedTryon.status,
+            GeneratedTryon.created_at,
+        ))
         .where(GeneratedTryon.user_id == user_id)
         .order_by(GeneratedTryon.created_at.desc())
         .offset(offset)
@@ -218,12 +302,32 @@ async def get_tryon_history(
     )
     tryons = result.scalars().all()
 
-    # Build response with URLs
+    # Only an empty page needs a user lookup to tell 404 from no history
+    if not tryons and await db.scalar(select(User.id).where(User.id == user_id)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found.",
+        )
+
+    # Only the status changes once a row is written, so ids and statuses
+    # identify the page contents. URLs resolved at read time depend on the
+    # public base URL, so a changed setting must invalidate cached pages too.
+    etag = compute_etag(
+        storage.public_base_url,
+        limit,
+        offset,
+        *(f"{row.id}/{row.status}" for row in tryons),
+    )
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+
+    # URLs are stored at write time; only resolve rows that lack one
     tryon_infos = []
     for t in tryons:
-        if t.clothing_image_key:
+        if t.clothing_image_key and not t.clothing_image_url:
             t.clothing_image_url = await storage.get_url(t.clothing_image_key)
-        if t.result_image_key:
+        if t.result_image_key and not t.result_image_url:
             t.result_image_url = await storage.get_url(t.result_image_key)
         tryon_infos.append(GeneratedTryonInfo.model_validate(t))
 
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+import asyncio
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, union_all
 
-from app.database import get_db
-from app.models import User
+from app.database import get_db, new_uuid
+from app.http_cache import compute_etag, not_modified
+from app.models import User, GeneratedImage, GeneratedVideo, GeneratedTryon
 from app.schemas import UserRegisterResponse, UserResponse
+from app.schemas.common import UUIDStr
+from app.services.image_processing import InvalidImageError, validate_image
 from app.services.storage import storage
 from app.config import get_settings
 
@@ -37,42 +41,52 @@ async def register_user(
             detail=f"Maximum {settings.max_images_allowed} images allowed. Got {len(images)}."
         )
 
-    # Read all images
-    image_bytes_list = []
     for img in images:
         if not img.content_type or not img.content_type.startswith("image/"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"File {img.filename} is not an image."
             )
-        content = await img.read()
-        image_bytes_list.append(content)
 
-    # Create user
-    user = User(name=name, reference_image_keys=[])
+    # Check every upload decodes as an image, in worker threads
+    validations = await asyncio.gather(
+        *(validate_image(img.file) for img in images),
+        return_exceptions=True,
+    )
+    for img, outcome in zip(images, validations):
+        if isinstance(outcome, InvalidImageError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File {img.filename} is not a valid image."
+            )
+        if isinstance(outcome, Exception):
+            raise outcome
+
+    # The id is assigned client-side, so storage keys need no flush
+    user_id = new_uuid()
+
+    # Stream all uploads to storage concurrently without buffering them
+    image_keys = [f"users/{user_id}/image_{idx}.jpg" for idx in range(len(images))]
+    await asyncio.gather(*(
+        storage.upload_fileobj(img.file, key)
+        for img, key in zip(images, image_keys)
+    ))
+
+    # Create user with a single INSERT; eager_defaults returns the
+    # server-side timestamps with it, so no refresh is needed
+    user = User(id=user_id, name=name, reference_image_keys=image_keys)
     db.add(user)
-    await db.flush()
-
-    # Store all images
-    image_keys = []
-    for idx, image_bytes in enumerate(image_bytes_list):
-        key = f"users/{user.id}/image_{idx}.jpg"
-        await storage.upload_image(image_bytes, key)
-        image_keys.append(key)
-
-    user.reference_image_keys = image_keys
-
     await db.commit()
-    await db.refresh(user)
 
     # Build response with URLs
-    image_urls = [await storage.get_url(key) for key in user.reference_image_keys]
+    image_urls = await asyncio.gather(*(storage.get_url(key) for key in user.reference_image_keys))
 
-    user_response = UserResponse(
+    # Every value comes from our own records, so skip re-validation
+    user_response = UserResponse.model_construct(
         id=user.id,
         name=user.name,
         reference_image_urls=image_urls,
-        images_count=len(image_keys),
+        images_count=user.images_count,
         created_at=user.created_at,
         updated_at=user.updated_at,
     )
@@ -85,12 +99,13 @@ async def register_user(
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
-    user_id: str,
+    user_id: UUIDStr,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
 ):
     """Get user details by ID."""
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
 
     if user is None:
         raise HTTPException(
@@ -98,15 +113,22 @@ async def get_user(
             detail=f"User with ID {user_id} not found."
         )
 
+    etag = compute_etag(user.id, user.updated_at.timestamp())
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+
     image_urls = []
     if user.reference_image_keys:
-        image_urls = [await storage.get_url(key) for key in user.reference_image_keys]
+        image_urls = await asyncio.gather(
+            *(storage.get_url(key) for key in user.reference_image_keys)
+        )
 
-    return UserResponse(
+    return UserResponse.model_construct(
         id=user.id,
         name=user.name,
         reference_image_urls=image_urls,
-        images_count=len(user.reference_image_keys) if user.reference_image_keys else 0,
+        images_count=user.images_count,
         created_at=user.created_at,
         updated_at=user.updated_at,
     )
@@ -114,12 +136,11 @@ async def get_user(
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
-    user_id: str,
+    user_id: UUIDStr,
     db: AsyncSession = Depends(get_db),
 ):
     """Delete a user and their associated images."""
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
 
     if user is None:
         raise HTTPException(
@@ -127,13 +148,19 @@ async def delete_user(
             detail=f"User with ID {user_id} not found."
         )
 
-    # Delete reference images from storage
-    if user.reference_image_keys:
-        for key in user.reference_image_keys:
-            try:
-                await storage.delete_image(key)
-            except Exception:
-                pass
+    # Collect every stored file the user owns in one query; the rows
+    # themselves go with the user through ON DELETE CASCADE
+    result = await db.execute(union_all(
+        select(GeneratedImage.image_s3_key).where(GeneratedImage.user_id == user_id),
+        select(GeneratedVideo.video_s3_key).where(GeneratedVideo.user_id == user_id),
+        select(GeneratedTryon.clothing_image_key).where(GeneratedTryon.user_id == user_id),
+        select(GeneratedTryon.result_image_key).where(GeneratedTryon.user_id == user_id),
+    ))
+    keys = [*(user.reference_image_keys or []), *(key for key in result.scalars() if key)]
 
     await db.delete(user)
     await db.commit()
+
+    # Delete all files from storage in one batch once the rows are gone;
+    # failures are ignored
+    await storage.delete_images(keys)
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select, tuple_
+from pydantic import TypeAdapter
 
-from app.database import get_db
-from app.models import User, GeneratedImage
+from app.database import get_db, new_uuid
+from app.models import User, GeneratedImage, PersistStatus
 from app.models.generated_video import GeneratedVideo
 from app.schemas.video import (
     GenerateVideoFromTextRequest,
@@ -11,15 +16,111 @@ from app.schemas.video import (
     GenerateVideoResponse,
     GeneratedVideoInfo,
 )
-from app.services.video import video_service
+from app.schemas.common import UUIDStr
+from app.services.persistence import set_persist_status
+from app.services.video import VideoGenerationTimeoutError, video_service
 from app.services.storage import storage
 
+logger = logging.getLogger(__name__)
+
+# Validates a whole history page in one call instead of one per row
+VIDEO_LIST_ADAPTER = TypeAdapter(list[GeneratedVideoInfo])
+
+VIDEO_ACCEPTED_MESSAGE = (
+    "Video generated successfully; it is being saved, and GET /video/{id} "
+    "reports its status until it is stored"
+)
+
 router = APIRouter(prefix="/video", tags=["video"])
 
 
-@router.post("/from-text", response_model=GenerateVideoResponse)
+def _encode_history_cursor(video: GeneratedVideo) -> str:
+    """Cursor for the page after ``video``: its UTC created_at and id, "_"-joined."""
+    created_at = video.created_at.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+    return f"{created_at}_{video.id}"
+
+
+def _decode_history_cursor(cursor: str) -> tuple[datetime, str]:
+    """Parse an X-Next-Cursor value back into (created_at, id)."""
+    try:
+        created_at, video_id = cursor.split("_", 1)
+        return datetime.fromisoformat(created_at), str(uuid.UUID(video_id))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor; pass the X-Next-Cursor header of the previous page."
+        )
+
+
+async def _persist_video(row: dict, video_bytes: bytes) -> None:
+    """
+    Upload a generated video, then mark its pending row completed.
+    Storage already retries transient errors; if the upload still fails, any
+    partial file is removed and the row is marked failed, so GET /video/{id}
+    reports the loss instead of a 404 that never resolves.
+    """
+    try:
+        await storage.upload_image(video_bytes, row["video_s3_key"], content_type="video/mp4")
+    except Exception:
+        logger.exception("Failed to store generated video %s", row["id"])
+        await storage.delete_images([row["video_s3_key"]])
+        outcome = PersistStatus.FAILED
+    else:
+        outcome = PersistStatus.COMPLETED
+
+    await set_persist_status(GeneratedVideo, [row["id"]], outcome)
+
+
+async def _schedule_video(
+    background_tasks: BackgroundTasks,
+    db: AsyncSession,
+    user_id: str,
+    prompt: str,
+    video_bytes: bytes,
+    source_type: str,
+    source_image_id: str | None = None,
+) -> GeneratedVideoInfo:
+    """
+    Allocate the video's id, key and URL, write its row as pending, and
+    upload it in the background.
+    Returns the info for the response, which is sent before the upload.
+    """
+    video_id = new_uuid()
+    storage_key = f"videos/{user_id}/{video_id}.mp4"
+    row = {
+        "id": video_id,
+        "user_id": user_id,
+        "prompt": prompt,
+        "video_s3_key": storage_key,
+        "video_url": await storage.get_url(storage_key),
+        "source_type": source_type,
+        "source_image_id": source_image_id,
+        "status": PersistStatus.PENDING.value,
+    }
+    # created_at comes from the database clock (server default)
+    created_at = await db.scalar(insert(GeneratedVideo).returning(GeneratedVideo.created_at), row)
+    await db.commit()
+    background_tasks.add_task(_persist_video, row, video_bytes)
+
+    return GeneratedVideoInfo.model_construct(
+        id=video_id,
+        video_url=row["video_url"],
+        prompt=prompt,
+        source_type=source_type,
+        source_image_id=source_image_id,
+        status=PersistStatus.PENDING,
+        created_at=created_at,
+    )
+
+
+@router.post(
+    "/from-text",
+    response_model=GenerateVideoResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def generate_video_from_text(
     request: GenerateVideoFromTextRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -29,7 +130,7 @@ async def generate_video_from_text(
     1. Fetch the user's reference images (if use_reference_images is True)
     2. Send them to Veo 3.1 with your prompt as reference assets
     3. Generate a video preserving the person's identity
-    4. Store and return the generated video
+    4. Return the generated video; storing it finishes in the background
 
     Example prompts:
     - "walking on a beach at sunset"
@@ -38,9 +139,11 @@ async def generate_video_from_text(
     - "cooking in a beautiful kitchen"
     - "jogging through a scenic park"
     """
-    # Get user
-    result = await db.execute(select(User).where(User.id == request.user_id))
-    user = result.scalar_one_or_none()
+    # Get user; only the reference keys are needed, not the full row
+    result = await db.execute(
+        select(User.id, User.reference_image_keys).where(User.id == request.user_id)
+    )
+    user = result.first()
 
     if user is None:
         raise HTTPException(
@@ -48,6 +151,10 @@ async def generate_video_from_text(
             detail=f"User with ID {request.user_id} not found. Please register first."
         )
 
+    # Return the connection to the pool before storage I/O and the
+    # multi-minute generation; the pending INSERT checks one out again
+    await db.close()
+
     # Load reference images if requested
     reference_images = None
     if request.use_reference_images:
@@ -58,13 +165,12 @@ async def generate_video_from_text(
                 detail="No reference images found for user. Upload reference images first."
             )
 
-        reference_images = []
-        for key in reference_keys:
-            try:
-                img_bytes = await storage.download_image(key)
-                reference_images.append(img_bytes)
-            except Exception:
-                continue  # Skip if image can't be loaded
+        # Load all references concurrently; skip any that can't be loaded
+        downloads = await asyncio.gather(
+            *(storage.download_image(key) for key in reference_keys),
+            return_exceptions=True,
+        )
+        reference_images = [img for img in downloads if not isinstance(img, Exception)]
 
         if not reference_images:
             raise HTTPException(
@@ -78,49 +184,38 @@ async def generate_video_from_text(
             prompt=request.prompt,
             reference_images=reference_images,
         )
+    except VideoGenerationTimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate video: {str(e)}"
         )
 
-    # Create database record
-    generated_video = GeneratedVideo(
-        user_id=user.id,
-        prompt=request.prompt,
-        video_s3_key="",
-        source_type="text",
+    # The upload runs after the response is sent
+    video_info = await _schedule_video(
+        background_tasks, db, user.id, request.prompt, video_bytes, source_type="text"
     )
-    db.add(generated_video)
-    await db.flush()
-
-    # Upload to storage
-    storage_key = f"videos/{user.id}/{generated_video.id}.mp4"
-    await storage.upload_image(video_bytes, storage_key, content_type="video/mp4")
-
-    # Update record
-    generated_video.video_s3_key = storage_key
-    video_url = await storage.get_url(storage_key)
-    generated_video.video_url = video_url
-
-    await db.commit()
 
     return GenerateVideoResponse(
         user_id=user.id,
         prompt=request.prompt,
-        video=GeneratedVideoInfo(
-            id=generated_video.id,
-            video_url=video_url,
-            prompt=request.prompt,
-            source_type="text",
-            created_at=generated_video.created_at,
-        ),
+        video=video_info,
+        message=VIDEO_ACCEPTED_MESSAGE,
     )
 
 
-@router.post("/from-image", response_model=GenerateVideoResponse)
+@router.post(
+    "/from-image",
+    response_model=GenerateVideoResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def generate_video_from_image(
     request: GenerateVideoFromImageRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -130,7 +225,7 @@ async def generate_video_from_image(
     1. Fetch the specified generated image
     2. Use it as the starting frame for video generation
     3. Animate the image according to your prompt
-    4. Store and return the generated video
+    4. Return the generated video; storing it finishes in the background
 
     Example prompts:
     - "gentle smile and slight head turn"
@@ -139,17 +234,7 @@ async def generate_video_from_image(
     - "turning to look at camera"
     - "subtle breathing and blinking"
     """
-    # Get user
-    result = await db.execute(select(User).where(User.id == request.user_id))
-    user = result.scalar_one_or_none()
-
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with ID {request.user_id} not found."
-        )
-
-    # Get the source image
+    # Get the source image; filtering on user_id also proves the user exists
     result = await db.execute(
         select(GeneratedImage).where(
             GeneratedImage.id == request.image_id,
@@ -159,11 +244,28 @@ async def generate_video_from_image(
     source_image = result.scalar_one_or_none()
 
     if source_image is None:
+        # Only a miss needs the user lookup, to pick the right 404
+        if await db.scalar(select(User.id).where(User.id == request.user_id)) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"User with ID {request.user_id} not found."
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Generated image with ID {request.image_id} not found for this user."
         )
 
+    # A pending or failed image has no stored file to animate
+    if source_image.status != PersistStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Generated image with ID {request.image_id} is {source_image.status}, not stored."
+        )
+
+    # Return the connection to the pool before storage I/O and the
+    # multi-minute generation; the pending INSERT checks one out again
+    await db.close()
+
     # Load the source image
     try:
         source_image_bytes = await storage.download_image(source_image.image_s3_key)
@@ -179,81 +281,111 @@ async def generate_video_from_image(
             prompt=request.prompt,
             source_image=source_image_bytes,
         )
+    except VideoGenerationTimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate video: {str(e)}"
         )
 
-    # Create database record
-    generated_video = GeneratedVideo(
-        user_id=user.id,
-        prompt=request.prompt,
-        video_s3_key="",
+    # The upload runs after the response is sent
+    video_info = await _schedule_video(
+        background_tasks,
+        db,
+        source_image.user_id,
+        request.prompt,
+        video_bytes,
         source_type="image",
         source_image_id=source_image.id,
     )
-    db.add(generated_video)
-    await db.flush()
-
-    # Upload to storage
-    storage_key = f"videos/{user.id}/{generated_video.id}.mp4"
-    await storage.upload_image(video_bytes, storage_key, content_type="video/mp4")
-
-    # Update record
-    generated_video.video_s3_key = storage_key
-    video_url = await storage.get_url(storage_key)
-    generated_video.video_url = video_url
-
-    await db.commit()
 
     return GenerateVideoResponse(
-        user_id=user.id,
+        user_id=source_image.user_id,
         prompt=request.prompt,
-        video=GeneratedVideoInfo(
-            id=generated_video.id,
-            video_url=video_url,
-            prompt=request.prompt,
-            source_type="image",
-            source_image_id=source_image.id,
-            created_at=generated_video.created_at,
-        ),
+        video=video_info,
+        message=VIDEO_ACCEPTED_MESSAGE,
     )
 
 
 @router.get("/history/{user_id}", response_model=list[GeneratedVideoInfo])
 async def get_video_history(
-    user_id: str,
-    limit: int = 20,
-    offset: int = 0,
+    user_id: UUIDStr,
+    response: Response,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = Query(
+        default=None,
+        description="X-Next-Cursor header of the previous page",
+    ),
+    offset: int = Query(default=0, deprecated=True, description="Use cursor instead"),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get the video generation history for a user."""
-    # Check if user exists
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    """
+    Get the video generation history for a user, newest first.
+    Pass the X-Next-Cursor header of a page as ``cursor`` to fetch the next
+    one; keyset pages cost the same at any depth, unlike ``offset``.
+    """
+    # Get generated videos; id breaks created_at ties so rows sharing a
+    # timestamp are neither skipped nor repeated across pages. The
+    # (user_id, created_at DESC, id DESC) index serves both the cursor
+    # predicate and the ordering.
+    query = (
+        select(GeneratedVideo)
+        .where(GeneratedVideo.user_id == user_id)
+        .order_by(GeneratedVideo.created_at.desc(), GeneratedVideo.id.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        cursor_created_at, cursor_id = _decode_history_cursor(cursor)
+        key = (GeneratedVideo.created_at, GeneratedVideo.id)
+        query = query.where(
+            tuple_(*key) < tuple_(cursor_created_at, cursor_id, types=[col.type for col in key])
+        )
+    elif offset:
+        query = query.offset(offset)
 
-    if user is None:
+    result = await db.execute(query)
+    videos = result.scalars().all()
+
+    # Only an empty page needs a user lookup to tell 404 from no history
+    if not videos and await db.scalar(select(User.id).where(User.id == user_id)) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with ID {user_id} not found."
         )
 
-    # Get generated videos
-    result = await db.execute(
-        select(GeneratedVideo)
-        .where(GeneratedVideo.user_id == user_id)
-        .order_by(GeneratedVideo.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-    )
-    videos = result.scalars().all()
+    # A full page may have more after it
+    if videos and len(videos) == limit:
+        response.headers["X-Next-Cursor"] = _encode_history_cursor(videos[-1])
 
-    # Build response with URLs
-    videos_info = []
-    for vid in videos:
-        if vid.video_s3_key:
-            vid.video_url = await storage.get_url(vid.video_s3_key)
-        videos_info.append(GeneratedVideoInfo.model_validate(vid))
+    # URLs are stored at write time; only resolve rows that lack one
+    missing = [vid for vid in videos if vid.video_s3_key and not vid.video_url]
+    urls = await asyncio.gather(*(storage.get_url(vid.video_s3_key) for vid in missing))
+    for vid, url in zip(missing, urls):
+        vid.video_url = url
+
+    return VIDEO_LIST_ADAPTER.validate_python(videos, from_attributes=True)
+
+
+@router.get("/{video_id}", response_model=GeneratedVideoInfo)
+async def get_video(
+    video_id: UUIDStr,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get a generated video by ID.
+    ``status`` is pending while the background upload runs, then completed,
+    or failed if the video could not be stored.
+    """
+    video = await db.get(GeneratedVideo, video_id)
+
+    if video is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Video with ID {video_id} not found."
+        )
 
-    return videos_info
+    return GeneratedVideoInfo.model_validate(video)
@@ -0,0 +1,15 @@
+from typing import Annotated
+from uuid import UUID
+
+from pydantic import AfterValidator
+
+
+def _normalize_uuid(value: str) -> str:
+    """Reject malformed IDs and return the canonical lowercase form."""
+    return str(UUID(value))
+
+
+# IDs are native uuid columns but travel through the app as strings.
+# Validating at the edge turns a malformed ID into a 422 instead of a
+# database error.
+UUIDStr = Annotated[str, AfterValidator(_normalize_uuid)]
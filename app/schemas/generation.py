@@ -1,7 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from enum import Enum
 
+from app.models.status import PersistStatus
+from app.schemas.common import UUIDStr
+
 
 class AspectRatio(str, Enum):
     SQUARE = "1:1"
@@ -13,7 +16,7 @@ class AspectRatio(str, Enum):
 
 class GenerateImageRequest(BaseModel):
     """Request to generate an image for a user."""
-    user_id: str = Field(..., description="The user ID to generate image for")
+    user_id: UUIDStr = Field(..., description="The user ID to generate image for")
     prompt: str = Field(
         ...,
         min_length=3,
@@ -34,14 +37,15 @@ class GenerateImageRequest(BaseModel):
 
 class GeneratedImageInfo(BaseModel):
     """Info about a single generated image."""
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     image_url: str
     prompt: str
+    # pending until the files are stored; failed means they were lost
+    status: PersistStatus = PersistStatus.COMPLETED
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class GenerateImageResponse(BaseModel):
     """Response with generated images."""
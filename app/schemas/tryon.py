@@ -1,7 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from enum import Enum
 
+from app.models.status import PersistStatus
+from app.schemas.common import UUIDStr
+
 
 class TryonAspectRatio(str, Enum):
     PORTRAIT_3_4 = "3:4"
@@ -12,7 +15,7 @@ class TryonAspectRatio(str, Enum):
 
 class VirtualTryonRequest(BaseModel):
     """Request for virtual try-on generation."""
-    user_id: str = Field(..., description="The user ID whose face/body to use")
+    user_id: UUIDStr = Field(..., description="The user ID whose face/body to use")
     clothing_description: str = Field(
         default="",
         max_length=1000,
@@ -36,15 +39,16 @@ class VirtualTryonRequest(BaseModel):
 
 class GeneratedTryonInfo(BaseModel):
     """Info about a single try-on result."""
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     clothing_image_url: str
     result_image_url: str
     prompt: str
+    # pending until the files are stored; failed means they were lost
+    status: PersistStatus = PersistStatus.COMPLETED
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class VirtualTryonResponse(BaseModel):
     """Response with try-on results."""
@@ -1,10 +1,13 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
+from app.models.status import PersistStatus
+from app.schemas.common import UUIDStr
+
 
 class GenerateVideoFromTextRequest(BaseModel):
     """Request to generate a video from text prompt."""
-    user_id: str = Field(..., description="The user ID to generate video for")
+    user_id: UUIDStr = Field(..., description="The user ID to generate video for")
     prompt: str = Field(
         ...,
         min_length=3,
@@ -19,8 +22,8 @@ class GenerateVideoFromTextRequest(BaseModel):
 
 class GenerateVideoFromImageRequest(BaseModel):
     """Request to generate a video from an existing generated image."""
-    user_id: str = Field(..., description="The user ID")
-    image_id: str = Field(..., description="The ID of a generated image to animate")
+    user_id: UUIDStr = Field(..., description="The user ID")
+    image_id: UUIDStr = Field(..., description="The ID of a generated image to animate")
     prompt: str = Field(
         ...,
         min_length=3,
@@ -31,17 +34,18 @@ class GenerateVideoFromImageRequest(BaseModel):
 
 class GeneratedVideoInfo(BaseModel):
     """Info about a single generated video."""
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     video_url: str
     prompt: str
     source_type: str
     source_image_id: str | None = None
     duration_seconds: float | None = None
+    # pending until the video is stored; failed means it was lost
+    status: PersistStatus = PersistStatus.COMPLETED
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class GenerateVideoResponse(BaseModel):
     """Response with generated video."""
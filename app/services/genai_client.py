@@ -0,0 +1,37 @@
+import logging
+from functools import lru_cache
+
+from google import genai
+from google.genai import types
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@lru_cache()
+def get_genai_client() -> genai.Client:
+    """
+    Process-wide GenAI client shared by the image and video services.
+    One client keeps one pool of HTTP connections, so TLS handshakes are
+    paid once per process rather than once per service.
+    """
+    return genai.Client(
+        api_key=settings.nano_banana_api_key,
+        http_options=types.HttpOptions(timeout=settings.genai_timeout_seconds * 1000),
+    )
+
+
+async def warm_up_genai_client() -> None:
+    """
+    Create the shared client and open its connection at startup, so the first
+    user request does not pay the TLS handshake. Failures are only logged:
+    requests will connect on demand as before.
+    """
+    if not settings.nano_banana_api_key:
+        return
+    try:
+        await get_genai_client().aio.models.list(config={"page_size": 1})
+    except Exception:
+        logger.warning("GenAI client warm-up failed", exc_info=True)
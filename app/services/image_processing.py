@@ -0,0 +1,95 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import BinaryIO, Callable, TypeVar
+
+from PIL import Image, ImageOps
+
+T = TypeVar("T")
+
+# Pillow releases the GIL in its codecs, so a small thread pool gives real
+# parallelism. Kept apart from the default executor so slow decodes cannot
+# starve storage I/O and other to_thread work.
+_image_executor = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1),
+    thread_name_prefix="image",
+)
+
+
+# Formats the Gemini and Veo APIs accept as inline image data
+API_IMAGE_MIME_TYPES = frozenset({"image/jpeg", "image/png", "image/webp"})
+
+# Leading magic bytes of common image formats
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+class InvalidImageError(ValueError):
+    """Uploaded data is not a decodable image."""
+
+
+async def run_image_task(func: Callable[..., T], *args) -> T:
+    """Run CPU-bound image work on the dedicated image thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_image_executor, partial(func, *args))
+
+
+def detect_image_mime_type(data: bytes, default: str = "image/jpeg") -> str:
+    """Sniff the MIME type from the file signature without decoding the image."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    return default
+
+
+def _validate_image_sync(data: bytes | BinaryIO) -> tuple[int, int]:
+    """Check the image structure without decoding pixels; return (width, height)."""
+    fileobj = io.BytesIO(data) if isinstance(data, bytes) else data
+    try:
+        fileobj.seek(0)
+        with Image.open(fileobj) as image:
+            size = image.size
+            image.verify()
+    except Exception as e:
+        raise InvalidImageError(str(e)) from e
+    finally:
+        fileobj.seek(0)
+    return size
+
+
+def is_api_image_format(data: bytes) -> bool:
+    """Whether the bytes can be sent to the generation APIs as they are."""
+    return detect_image_mime_type(data, default="") in API_IMAGE_MIME_TYPES
+
+
+def ensure_api_image_format(data: bytes) -> bytes:
+    """
+    Return the bytes unchanged if the APIs accept their format, otherwise
+    re-encode them as JPEG (TIFF, BMP, GIF, ... pass upload validation).
+    CPU-bound, so callers run it on the image thread pool.
+    """
+    if is_api_image_format(data):
+        return data
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def validate_image(data: bytes | BinaryIO) -> tuple[int, int]:
+    """
+    Validate image bytes or a file object on the image thread pool.
+    Parsing is CPU-bound, so it stays off the event loop.
+    Raises InvalidImageError if the data is not a readable image.
+    """
+    return await run_image_task(_validate_image_sync, data)
@@ -1,11 +1,176 @@
 import io
+import re
+import time
+import random
+import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
 from google import genai
-from google.genai import types
-from PIL import Image
+from google.genai import errors, types
+from PIL import Image, ImageOps
 from app.config import get_settings
+from app.services.genai_client import get_genai_client
+from app.services.image_processing import detect_image_mime_type, is_api_image_format, run_image_task
 
 settings = get_settings()
 
+# generate_content is retried on rate limiting and transient server errors,
+# with exponential backoff plus jitter between attempts
+GENERATE_RETRY_ATTEMPTS = 4
+GENERATE_RETRY_BASE_DELAY = 1.0
+GENERATE_RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 503, 504})
+
+# JPEG encoder settings for references sent to the API: favour encode speed
+JPEG_SAVE_OPTIONS = {"quality": 82, "optimize": False, "progressive": False}
+
+# References larger than this (longest edge, px) are downscaled before upload;
+# files under the byte threshold are sent untouched without being opened
+REFERENCE_MAX_EDGE = 1024
+REFERENCE_DOWNSCALE_MIN_BYTES = 300_000
+
+# Scene keywords in priority order: the first one found in the prompt wins
+SCENE_ENHANCEMENTS = {
+    "beach": "warm natural sunlight, ocean in background, sand texture, casual atmosphere, candid realism",
+    "gym": "overhead gym lights, worn equipment in background, natural sweat, candid phone photo feel",
+    "cafe": "indoor ambient light, coffee shop background, casual seating, everyday realism",
+    "coffee": "warm indoor light, cafe background, relaxed atmosphere, candid moment",
+    "office": "fluorescent office lighting, real workspace clutter, natural daylight from windows, casual realism",
+    "nature": "natural outdoor light, real greenery, unposed outdoor moment, candid realism",
+    "city": "urban street setting, natural city light, pedestrians in background, shot like a casual phone photo",
+    "home": "warm indoor lighting, lived-in interior, everyday home setting, candid realism",
+    "party": "mixed indoor lighting, real party setting, candid moment capture, not staged",
+    "wedding": "soft natural light, real venue setting, elegant but candid, genuine moment",
+    "mountain": "natural outdoor light, real mountain backdrop, hiking gear, candid trail moment",
+    "restaurant": "warm restaurant lighting, real table setting, casual dining moment, candid realism",
+    "park": "natural daylight, real park setting, trees and grass, casual outdoor moment",
+    "hiking": "natural trail lighting, outdoor scenery, real hiking moment, candid phone photo feel",
+    "graduation": "outdoor ceremony light, real academic setting, proud but candid moment",
+    "concert": "stage lights and crowd, live event atmosphere, candid fan photo energy",
+}
+
+# Lookahead so overlapping keywords are all reported in a single scan
+_SCENE_RE = re.compile("(?=(%s))" % "|".join(map(re.escape, SCENE_ENHANCEMENTS)))
+
+MOOD_MAPPINGS = {
+    ("happy", "joy", "celebrating", "party", "fun", "laugh", "smile"):
+        "natural smile, relaxed and candid, not overly posed",
+    ("confident", "business", "presentation", "professional", "meeting"):
+        "natural confident look, casual composure, realistic body language",
+    ("relaxed", "beach", "vacation", "spa", "peaceful", "calm"):
+        "relaxed natural expression, casual unposed body language",
+    ("excited", "adventure", "travel", "sports", "thrilled"):
+        "natural excited expression, caught mid-moment, candid energy",
+    ("romantic", "date", "wedding", "love", "dinner"):
+        "soft natural expression, genuine warmth, candid moment",
+    ("elegant", "gala", "formal", "luxury", "fashion"):
+        "natural poise, real-feeling elegance, not overly staged",
+    ("thoughtful", "reading", "studying", "working", "thinking"):
+        "naturally focused, candid mid-thought moment, realistic gaze",
+}
+
+# Keyword -> (group priority, expression), so one scan finds every mood hint
+_MOOD_BY_KEYWORD = {
+    keyword: (priority, expression)
+    for priority, (keywords, expression) in enumerate(MOOD_MAPPINGS.items())
+    for keyword in keywords
+}
+_MOOD_RE = re.compile("(?=(%s))" % "|".join(map(re.escape, _MOOD_BY_KEYWORD)))
+
+# Prompts treated as already detailed are sent without enhancement: anything
+# longer than ENHANCE_MAX_PROMPT_CHARS, or at least DETAILED_PROMPT_MIN_CHARS
+# long and naming both a scene and a (different) mood keyword. Short prompts
+# are always enhanced, since the substring scan finds incidental hits in them
+# ("joy" in "enjoying").
+ENHANCE_MAX_PROMPT_CHARS = 200
+DETAILED_PROMPT_MIN_CHARS = 80
+
+# Static prompt bodies; only the user-supplied parts are filled in per call
+GENERATION_PROMPT_TEMPLATE = (
+    "This is a photo of a specific person. Generate a new image "
+    "of THIS EXACT SAME PERSON in the following scene: {scene}.\n\n"
+    "CRITICAL RULES:\n"
+    "1. The person's face must be IDENTICAL to the reference — same bone structure, "
+    "same eyes, same nose, same lips, same jawline, same skin tone. Do NOT alter "
+    "any facial feature. The person must be instantly recognizable.\n"
+    "2. Preserve ALL distinguishing features: glasses, facial hair, moles, freckles, "
+    "scars, birthmarks, hair color, hair texture, ear shape, eyebrow shape.\n"
+    "3. Keep the same body type and proportions as the reference.\n"
+    "4. Any expression change must only involve natural muscle movement — the underlying "
+    "facial geometry must remain unchanged.\n"
+    "5. Natural realistic lighting for the scene, realistic skin texture with natural "
+    "imperfections, candid phone photo quality. Avoid overly polished or studio-perfect "
+    "look. The image should feel like a real candid photo, not AI-generated. Almost real.\n\n"
+    "Scene: {user_prompt}"
+)
+
+TRYON_PROMPT = (
+    "I am providing two images:\n"
+    "- IMAGE 1 (first image): A photo of a specific person. This is the PERSON reference.\n"
+    "- IMAGE 2 (second image): A photo of a clothing item/outfit. This is the CLOTHING reference.\n\n"
+    "TASK: Generate a new photorealistic image showing the EXACT SAME PERSON from Image 1 "
+    "wearing the EXACT SAME CLOTHING from Image 2.\n\n"
+    "PERSON IDENTITY RULES (NON-NEGOTIABLE):\n"
+    "- The face must be IDENTICAL to Image 1 — same bone structure, eyes, nose, lips, "
+    "jawline, skin tone, skin texture. NOT similar — IDENTICAL.\n"
+    "- Preserve ALL distinguishing features: glasses, facial hair, moles, freckles, "
+    "birthmarks, hair color, hair texture, ear shape, eyebrow shape.\n"
+    "- Same body type and proportions as Image 1.\n\n"
+    "CLOTHING RULES (NON-NEGOTIABLE):\n"
+    "- The clothing must match Image 2 EXACTLY — same design, same color, same pattern, "
+    "same fabric texture, same style details (buttons, zippers, collars, prints, logos).\n"
+    "- The clothing should fit naturally on the person's body — proper draping, "
+    "realistic wrinkles and folds based on their body shape.\n"
+    "- Do NOT modify the clothing design in any way. Do NOT change the color or pattern.\n\n"
+    "OUTPUT REQUIREMENTS:\n"
+    "- Full body or upper body shot showing the clothing clearly.\n"
+    "- Professional photography quality, studio or lifestyle setting.\n"
+    "- Natural pose that shows off the clothing well.\n"
+    "- Clean, well-lit background that doesn't distract from the outfit.\n"
+    "- Photorealistic result — should look like a real photo, not AI-generated."
+)
+
+TRYON_CONTEXT_SUFFIX = "\n\nADDITIONAL CONTEXT: {clothing_description}"
+
+
+class ResponseCache:
+    """
+    In-process TTL + LRU cache of generation results, keyed by a digest of the inputs.
+    Only used when GENAI_CACHE_TTL_SECONDS is set: a hit returns the same images
+    as the earlier call instead of fresh variations.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[float, list[bytes]]] = OrderedDict()
+
+    @staticmethod
+    def make_key(prompt: str, images: list[bytes], aspect_ratio: str, number_of_images: int) -> bytes:
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(f"{aspect_ratio}\0{number_of_images}\0{len(images)}\0{prompt}".encode())
+        for image in images:
+            hasher.update(hashlib.blake2b(image, digest_size=16).digest())
+        return hasher.digest()
+
+    def get(self, key: bytes) -> list[bytes] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, images = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return list(images)
+
+    def put(self, key: bytes, images: list[bytes]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, list(images))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
 
 class NanoBananaService:
     """
@@ -17,84 +182,126 @@ class NanoBananaService:
     """
 
     def __init__(self):
-        self.client = genai.Client(api_key=settings.nano_banana_api_key)
         self.model = "gemini-3-pro-image-preview"
+        self._generate_limit = asyncio.Semaphore(settings.genai_max_concurrency)
+        self._cache = (
+            ResponseCache(settings.genai_cache_ttl_seconds, settings.genai_cache_max_entries)
+            if settings.genai_cache_ttl_seconds > 0
+            else None
+        )
+
+    @property
+    def client(self) -> genai.Client:
+        """Shared GenAI client, created on first use so importing the app stays cheap."""
+        return get_genai_client()
 
     def _bytes_to_pil_image(self, image_bytes: bytes) -> Image.Image:
         """Convert image bytes to PIL Image."""
         return Image.open(io.BytesIO(image_bytes))
 
+    def _bytes_to_part(self, image_bytes: bytes) -> types.Part:
+        """Wrap image bytes for the request as-is, without a decode/re-encode round trip."""
+        return types.Part.from_bytes(data=image_bytes, mime_type=detect_image_mime_type(image_bytes))
+
     def _pil_image_to_bytes(self, pil_image: Image.Image, format: str = "JPEG") -> bytes:
-        """Convert PIL Image to bytes."""
+        """Convert PIL Image to bytes, using JPEG_SAVE_OPTIONS for JPEG output."""
+        save_options = JPEG_SAVE_OPTIONS if format == "JPEG" else {}
         buffer = io.BytesIO()
-        pil_image.save(buffer, format=format)
+        pil_image.save(buffer, format=format, **save_options)
         buffer.seek(0)
         return buffer.read()
 
+    def _prepare_reference(self, image_bytes: bytes) -> bytes:
+        """
+        Downscale an oversized reference image to REFERENCE_MAX_EDGE, and
+        re-encode formats Gemini does not accept (TIFF, BMP, GIF, ...) as JPEG.
+        Phone photos are often 12MP; sending them at full size inflates request
+        bytes and input tokens without helping identity preservation.
+        CPU-bound, so callers run it on the image thread pool.
+        """
+        supported = is_api_image_format(image_bytes)
+        if supported and len(image_bytes) < REFERENCE_DOWNSCALE_MIN_BYTES:
+            return image_bytes
+
+        image = self._bytes_to_pil_image(image_bytes)
+        oversized = max(image.size) > REFERENCE_MAX_EDGE
+        if supported and not oversized:
+            return image_bytes
+
+        if oversized:
+            # Let libjpeg decode at a reduced DCT scale that still covers the target
+            # size, so the resize starts from a fraction of the pixels (no-op for
+            # non-JPEG formats)
+            image.draft("RGB", (REFERENCE_MAX_EDGE, REFERENCE_MAX_EDGE))
+
+        # Bake in the EXIF rotation, which the re-encoded file no longer carries
+        image = ImageOps.exif_transpose(image)
+        if oversized:
+            image.thumbnail((REFERENCE_MAX_EDGE, REFERENCE_MAX_EDGE), Image.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return self._pil_image_to_bytes(image)
+
+    async def _prepare_references(
+        self, images: list[bytes], optional: range = range(0)
+    ) -> list[types.Part]:
+        """
+        Downscale references concurrently and wrap them as request parts.
+        Images at the ``optional`` indexes (extra person references) are
+        skipped if they cannot be read; any other failure is raised.
+        """
+        prepared = await asyncio.gather(
+            *(run_image_task(self._prepare_reference, image) for image in images),
+            return_exceptions=True,
+        )
+        parts = []
+        for index, image in enumerate(prepared):
+            if isinstance(image, Exception):
+                if index not in optional:
+                    raise image
+                continue
+            parts.append(self._bytes_to_part(image))
+        return parts
+
     # ─── Scene & mood enhancement ────────────────────────────────────────
 
-    def _enhance_user_prompt(self, user_prompt: str) -> str:
-        """Add scene and mood details to a short user prompt."""
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _enhance_user_prompt(user_prompt: str) -> str:
+        """
+        Add scene and mood details to a short user prompt.
+        Prompts that are already long, or fairly long and naming both a scene
+        and a mood, are returned unchanged: canned text would only dilute them.
+        """
+        if len(user_prompt) > ENHANCE_MAX_PROMPT_CHARS:
+            return user_prompt
+
         prompt_lower = user_prompt.lower()
 
-        scene_enhancements = {
-            "beach": "warm natural sunlight, ocean in background, sand texture, casual atmosphere, candid realism",
-            "gym": "overhead gym lights, worn equipment in background, natural sweat, candid phone photo feel",
-            "cafe": "indoor ambient light, coffee shop background, casual seating, everyday realism",
-            "coffee": "warm indoor light, cafe background, relaxed atmosphere, candid moment",
-            "office": "fluorescent office lighting, real workspace clutter, natural daylight from windows, casual realism",
-            "nature": "natural outdoor light, real greenery, unposed outdoor moment, candid realism",
-            "city": "urban street setting, natural city light, pedestrians in background, shot like a casual phone photo",
-            "home": "warm indoor lighting, lived-in interior, everyday home setting, candid realism",
-            "party": "mixed indoor lighting, real party setting, candid moment capture, not staged",
-            "wedding": "soft natural light, real venue setting, elegant but candid, genuine moment",
-            "mountain": "natural outdoor light, real mountain backdrop, hiking gear, candid trail moment",
-            "restaurant": "warm restaurant lighting, real table setting, casual dining moment, candid realism",
-            "park": "natural daylight, real park setting, trees and grass, casual outdoor moment",
-            "hiking": "natural trail lighting, outdoor scenery, real hiking moment, candid phone photo feel",
-            "graduation": "outdoor ceremony light, real academic setting, proud but candid moment",
-            "concert": "stage lights and crowd, live event atmosphere, candid fan photo energy",
-        }
-
-        mood_mappings = {
-            ("happy", "joy", "celebrating", "party", "fun", "laugh", "smile"):
-                "natural smile, relaxed and candid, not overly posed",
-            ("confident", "business", "presentation", "professional", "meeting"):
-                "natural confident look, casual composure, realistic body language",
-            ("relaxed", "beach", "vacation", "spa", "peaceful", "calm"):
-                "relaxed natural expression, casual unposed body language",
-            ("excited", "adventure", "travel", "sports", "thrilled"):
-                "natural excited expression, caught mid-moment, candid energy",
-            ("romantic", "date", "wedding", "love", "dinner"):
-                "soft natural expression, genuine warmth, candid moment",
-            ("elegant", "gala", "formal", "luxury", "fashion"):
-                "natural poise, real-feeling elegance, not overly staged",
-            ("thoughtful", "reading", "studying", "working", "thinking"):
-                "naturally focused, candid mid-thought moment, realistic gaze",
-        }
+        found_scenes = {match.group(1) for match in _SCENE_RE.finditer(prompt_lower)}
+        found_moods = {match.group(1) for match in _MOOD_RE.finditer(prompt_lower)}
+        if len(user_prompt) >= DETAILED_PROMPT_MIN_CHARS and found_scenes and found_moods - found_scenes:
+            return user_prompt
 
         parts = [user_prompt]
 
-        for scene, enhancement in scene_enhancements.items():
-            if scene in prompt_lower:
+        for scene, enhancement in SCENE_ENHANCEMENTS.items():
+            if scene in found_scenes:
                 parts.append(enhancement)
                 break
 
-        expression_added = False
-        for keywords, expression in mood_mappings.items():
-            if any(kw in prompt_lower for kw in keywords):
-                parts.append(expression)
-                expression_added = True
-                break
-
-        if not expression_added:
+        if found_moods:
+            parts.append(min(_MOOD_BY_KEYWORD[keyword] for keyword in found_moods)[1])
+        else:
             parts.append("natural expression, candid and unposed")
 
         return ", ".join(parts)
 
     # ─── Prompt builders ─────────────────────────────────────────────────
 
-    def _build_generation_prompt(self, user_prompt: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _build_generation_prompt(user_prompt: str) -> str:
         """
         Build a concise, high-signal prompt for identity-preserving generation.
 
@@ -102,83 +309,100 @@ class NanoBananaService:
         than to walls of text. The reference image does most of the work — the prompt
         just needs to anchor the model to it firmly.
         """
-        enhanced_scene = self._enhance_user_prompt(user_prompt)
-
-        prompt = (
-            f"This is a photo of a specific person. Generate a new image "
-            f"of THIS EXACT SAME PERSON in the following scene: {enhanced_scene}.\n\n"
-            f"CRITICAL RULES:\n"
-            f"1. The person's face must be IDENTICAL to the reference — same bone structure, "
-            f"same eyes, same nose, same lips, same jawline, same skin tone. Do NOT alter "
-            f"any facial feature. The person must be instantly recognizable.\n"
-            f"2. Preserve ALL distinguishing features: glasses, facial hair, moles, freckles, "
-            f"scars, birthmarks, hair color, hair texture, ear shape, eyebrow shape.\n"
-            f"3. Keep the same body type and proportions as the reference.\n"
-            f"4. Any expression change must only involve natural muscle movement — the underlying "
-            f"facial geometry must remain unchanged.\n"
-            f"5. Natural realistic lighting for the scene, realistic skin texture with natural "
-            f"imperfections, candid phone photo quality. Avoid overly polished or studio-perfect "
-            f"look. The image should feel like a real candid photo, not AI-generated. Almost real.\n\n"
-            f"Scene: {user_prompt}"
-        )
+        enhanced_scene = NanoBananaService._enhance_user_prompt(user_prompt)
+        return GENERATION_PROMPT_TEMPLATE.format(scene=enhanced_scene, user_prompt=user_prompt)
 
-        return prompt
-
-    def _build_tryon_prompt(self, clothing_description: str = "") -> str:
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _build_tryon_prompt(clothing_description: str = "") -> str:
         """
         Build prompt for virtual try-on.
 
         Strategy: Two images are sent — Image 1 (person) and Image 2 (clothing).
         The prompt instructs the model to dress the person in the exact garment.
         """
-        base_prompt = (
-            "I am providing two images:\n"
-            "- IMAGE 1 (first image): A photo of a specific person. This is the PERSON reference.\n"
-            "- IMAGE 2 (second image): A photo of a clothing item/outfit. This is the CLOTHING reference.\n\n"
-            "TASK: Generate a new photorealistic image showing the EXACT SAME PERSON from Image 1 "
-            "wearing the EXACT SAME CLOTHING from Image 2.\n\n"
-            "PERSON IDENTITY RULES (NON-NEGOTIABLE):\n"
-            "- The face must be IDENTICAL to Image 1 — same bone structure, eyes, nose, lips, "
-            "jawline, skin tone, skin texture. NOT similar — IDENTICAL.\n"
-            "- Preserve ALL distinguishing features: glasses, facial hair, moles, freckles, "
-            "birthmarks, hair color, hair texture, ear shape, eyebrow shape.\n"
-            "- Same body type and proportions as Image 1.\n\n"
-            "CLOTHING RULES (NON-NEGOTIABLE):\n"
-            "- The clothing must match Image 2 EXACTLY — same design, same color, same pattern, "
-            "same fabric texture, same style details (buttons, zippers, collars, prints, logos).\n"
-            "- The clothing should fit naturally on the person's body — proper draping, "
-            "realistic wrinkles and folds based on their body shape.\n"
-            "- Do NOT modify the clothing design in any way. Do NOT change the color or pattern.\n\n"
-            "OUTPUT REQUIREMENTS:\n"
-            "- Full body or upper body shot showing the clothing clearly.\n"
-            "- Professional photography quality, studio or lifestyle setting.\n"
-            "- Natural pose that shows off the clothing well.\n"
-            "- Clean, well-lit background that doesn't distract from the outfit.\n"
-            "- Photorealistic result — should look like a real photo, not AI-generated."
-        )
-
+        # The static body is kept byte-identical so only the optional suffix varies
         if clothing_description:
-            base_prompt += (
-                f"\n\nADDITIONAL CONTEXT: {clothing_description}"
-            )
-
-        return base_prompt
+            return TRYON_PROMPT + TRYON_CONTEXT_SUFFIX.format(clothing_description=clothing_description)
+        return TRYON_PROMPT
 
     # ─── Image extraction helper ─────────────────────────────────────────
 
     def _extract_images_from_response(self, response) -> list[bytes]:
         """Extract generated image bytes from a Gemini API response."""
-        images = []
-        if response.candidates:
-            for candidate in response.candidates:
-                if candidate.content and candidate.content.parts:
-                    for part in candidate.content.parts:
-                        if part.inline_data and part.inline_data.data:
-                            images.append(part.inline_data.data)
-        return images
+        return [
+            part.inline_data.data
+            for candidate in response.candidates or ()
+            if candidate.content and candidate.content.parts
+            for part in candidate.content.parts
+            if part.inline_data and part.inline_data.data
+        ]
 
     # ─── Core generation methods ─────────────────────────────────────────
 
+    async def _generate(self, contents: list, aspect_ratio: str):
+        """
+        Run one generate_content call, bounded by the concurrency limit.
+        Rate limits and transient server errors are retried; the backoff
+        happens outside the semaphore so a waiting call does not hold a slot.
+        The client's HTTP timeout (genai_timeout_seconds) bounds each call, and
+        a timed-out call is not retried: the request may still have been
+        processed and billed.
+        """
+        for attempt in range(GENERATE_RETRY_ATTEMPTS):
+            try:
+                async with self._generate_limit:
+                    return await self.client.aio.models.generate_content(
+                        model=self.model,
+                        contents=contents,
+                        config=types.GenerateContentConfig(
+                            response_modalities=["TEXT", "IMAGE"],
+                            image_config=types.ImageConfig(
+                                aspect_ratio=aspect_ratio,
+                            ),
+                        ),
+                    )
+            except errors.APIError as e:
+                if attempt == GENERATE_RETRY_ATTEMPTS - 1 or e.code not in RETRYABLE_STATUS_CODES:
+                    raise
+
+            delay = min(GENERATE_RETRY_MAX_DELAY, GENERATE_RETRY_BASE_DELAY * 2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, GENERATE_RETRY_BASE_DELAY))
+
+    async def _generate_images(
+        self,
+        prompt: str,
+        images: list[bytes],
+        aspect_ratio: str,
+        number_of_images: int,
+        optional: range = range(0),
+    ) -> list[bytes]:
+        """
+        Generate variations from a prompt and its reference images, in that order.
+        Unreadable images at the ``optional`` indexes are left out.
+        """
+        cache_key = None
+        if self._cache is not None:
+            cache_key = ResponseCache.make_key(prompt, images, aspect_ratio, number_of_images)
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        contents = [prompt, *await self._prepare_references(images, optional)]
+
+        # Each variation is an independent request, so issue them concurrently
+        responses = await asyncio.gather(
+            *(self._generate(contents, aspect_ratio) for _ in range(number_of_images))
+        )
+
+        generated_images = []
+        for response in responses:
+            generated_images.extend(self._extract_images_from_response(response))
+
+        if cache_key is not None and generated_images:
+            self._cache.put(cache_key, generated_images)
+        return generated_images
+
     async def generate_image(
         self,
         prompt: str,
@@ -194,38 +418,13 @@ class NanoBananaService:
         """
         full_prompt = self._build_generation_prompt(user_prompt=prompt)
 
-        # Convert reference images to PIL
-        reference_pil = self._bytes_to_pil_image(reference_image)
-
         # Build contents: prompt first, then all reference images
         # Sending multiple refs gives the model more angles to lock onto the face
-        contents = [full_prompt, reference_pil]
-
-        if additional_references:
-            for ref_bytes in additional_references[:3]:  # Max 3 extra refs
-                try:
-                    ref_pil = self._bytes_to_pil_image(ref_bytes)
-                    contents.append(ref_pil)
-                except Exception:
-                    continue
-
-        generated_images = []
-
-        for _ in range(number_of_images):
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    response_modalities=["TEXT", "IMAGE"],
-                    image_config=types.ImageConfig(
-                        aspect_ratio=aspect_ratio,
-                    ),
-                ),
-            )
-
-            generated_images.extend(self._extract_images_from_response(response))
-
-        return generated_images
+        references = [reference_image, *(additional_references or [])[:3]]  # Max 3 extra refs
+        return await self._generate_images(
+            full_prompt, references, aspect_ratio, number_of_images,
+            optional=range(1, len(references)),
+        )
 
     async def generate_tryon(
         self,
@@ -252,44 +451,15 @@ class NanoBananaService:
         """
         prompt = self._build_tryon_prompt(clothing_description)
 
-        # Convert images to PIL
-        person_pil = self._bytes_to_pil_image(person_image)
-        clothing_pil = self._bytes_to_pil_image(clothing_image)
-
         # Build contents: prompt → person image(s) → clothing image
         # Order matters: person refs first, clothing last, so the model
-        # clearly distinguishes "who" from "what to wear"
-        contents = [prompt, person_pil]
-
-        # Add extra person references for stronger identity lock
-        if additional_person_refs:
-            for ref_bytes in additional_person_refs[:2]:  # Max 2 extra
-                try:
-                    ref_pil = self._bytes_to_pil_image(ref_bytes)
-                    contents.append(ref_pil)
-                except Exception:
-                    continue
-
-        # Clothing image goes last
-        contents.append(clothing_pil)
-
-        generated_images = []
-
-        for _ in range(number_of_images):
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    response_modalities=["TEXT", "IMAGE"],
-                    image_config=types.ImageConfig(
-                        aspect_ratio=aspect_ratio,
-                    ),
-                ),
-            )
-
-            generated_images.extend(self._extract_images_from_response(response))
-
-        return generated_images
+        # clearly distinguishes "who" from "what to wear".
+        # Up to 2 extra person references give a stronger identity lock.
+        images = [person_image, *(additional_person_refs or [])[:2], clothing_image]
+        return await self._generate_images(
+            prompt, images, aspect_ratio, number_of_images,
+            optional=range(1, len(images) - 1),
+        )
 
 
 # Singleton instance
@@ -0,0 +1,36 @@
+import asyncio
+import logging
+
+from sqlalchemy import update
+
+from app.database import AsyncSessionLocal
+from app.models import PersistStatus
+
+logger = logging.getLogger(__name__)
+
+# The status update is attempted this many times, with exponential backoff
+STATUS_UPDATE_ATTEMPTS = 3
+STATUS_UPDATE_BASE_DELAY = 0.5
+
+
+async def set_persist_status(model: type, ids: list[str], status: PersistStatus) -> None:
+    """
+    Record the outcome of a background upload on rows written as pending.
+    Runs in a fresh session, since the request-scoped one is closed by then.
+    Failures are logged rather than raised: there is no caller left to tell.
+    """
+    for attempt in range(STATUS_UPDATE_ATTEMPTS):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(model).where(model.id.in_(ids)).values(status=status.value)
+                )
+                await db.commit()
+            return
+        except Exception:
+            if attempt == STATUS_UPDATE_ATTEMPTS - 1:
+                logger.exception(
+                    "Failed to mark %s rows %s as %s", model.__tablename__, ids, status.value
+                )
+                return
+            await asyncio.sleep(STATUS_UPDATE_BASE_DELAY * 2 ** attempt)
@@ -1,9 +1,63 @@
-import aiofiles
+import asyncio
+import errno
+import hashlib
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
 from pathlib import Path
+from typing import Awaitable, BinaryIO, Callable, TypeVar
 
 from app.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Storage I/O is attempted this many times before an error is raised
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.1
+
+# Read size when streaming uploads to disk; fewer, larger copies than the
+# 64 KiB shutil default for multi-MB photos
+COPY_CHUNK_SIZE = 256 * 1024
+
+# Content-addressed store at settings.storage_blob_path. Every stored file is
+# a hard link to <blob root>/<digest[:2]>/<digest>, so identical uploads share
+# one copy on disk. The blob root sits outside base_path, which is served
+# publicly, so blobs never get a second, guessable URL.
+LEGACY_CAS_DIR = "cas"
+# Unreferenced blobs younger than this are left alone by pruning, so an
+# upload between writing its blob and linking its key is never raced
+CAS_PRUNE_GRACE_SECONDS = 3600
+
+# Link failures meaning the filesystem cannot hard-link; fall back to copies
+NO_LINK_ERRNOS = frozenset({errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP})
+
+# OSError codes worth retrying, e.g. a briefly unavailable network volume.
+# Missing files, permissions and a full disk fail immediately.
+TRANSIENT_ERRNOS = frozenset({
+    errno.EAGAIN,
+    errno.EBUSY,
+    errno.EINTR,
+    errno.EIO,
+    errno.ESTALE,
+    errno.ETIMEDOUT,
+})
+
+
+async def _with_retry(operation: Callable[[], Awaitable[T]]) -> T:
+    """Run a storage operation, retrying transient OS errors with backoff."""
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return await operation()
+        except OSError as e:
+            if attempt == RETRY_ATTEMPTS - 1 or e.errno not in TRANSIENT_ERRNOS:
+                raise
+            await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt + random.uniform(0, RETRY_BASE_DELAY))
 
 
 class LocalStorage:
@@ -14,11 +68,16 @@ class LocalStorage:
 
     def __init__(self):
         self.base_path = Path(settings.storage_path)
-        self._ensure_base_path()
+        self.blob_path = Path(settings.storage_blob_path)
+        self.public_base_url = settings.storage_public_base_url.rstrip("/")
+        # Caps concurrent file operations so gathered uploads and downloads
+        # cannot exhaust the worker thread pool
+        self._io_limit = asyncio.Semaphore(settings.storage_max_concurrency)
 
-    def _ensure_base_path(self) -> None:
-        """Ensure the base storage directory exists."""
-        self.base_path.mkdir(parents=True, exist_ok=True)
+    async def _run(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """Run a storage operation under the concurrency limit, with retries."""
+        async with self._io_limit:
+            return await _with_retry(operation)
 
     def _get_full_path(self, key: str) -> Path:
         """Get the full filesystem path for a storage key."""
@@ -32,50 +91,170 @@ class LocalStorage:
     ) -> str:
         """Save an image to local storage and return the key."""
         full_path = self._get_full_path(key)
+        await self._run(lambda: asyncio.to_thread(self._write_bytes, full_path, file_data))
+        return key
 
-        # Ensure parent directories exist
-        full_path.parent.mkdir(parents=True, exist_ok=True)
-
-        async with aiofiles.open(full_path, "wb") as f:
-            await f.write(file_data)
+    def _write_bytes(self, full_path: Path, file_data: bytes) -> None:
+        blob_path = self._blob_path(hashlib.blake2b(file_data, digest_size=16).hexdigest())
+        if not blob_path.exists():
+            self._commit_blob(self._write_temp(lambda f: f.write(file_data)), blob_path)
+        try:
+            self._link(blob_path, full_path)
+        except FileNotFoundError:
+            # The blob was pruned after the exists() check; store it again
+            self._commit_blob(self._write_temp(lambda f: f.write(file_data)), blob_path)
+            self._link(blob_path, full_path)
 
+    async def upload_fileobj(
+        self,
+        fileobj: BinaryIO,
+        key: str,
+        content_type: str = "image/jpeg"
+    ) -> str:
+        """Stream a file-like object to local storage and return the key."""
+        full_path = self._get_full_path(key)
+        await self._run(lambda: asyncio.to_thread(self._copy_fileobj, fileobj, full_path))
         return key
 
+    def _copy_fileobj(self, fileobj: BinaryIO, full_path: Path) -> None:
+        # Hash while copying, since the digest is only known once the stream ends
+        hasher = hashlib.blake2b(digest_size=16)
+
+        def copy(f: BinaryIO) -> None:
+            # Rewind so a retried copy starts over
+            fileobj.seek(0)
+            while chunk := fileobj.read(COPY_CHUNK_SIZE):
+                hasher.update(chunk)
+                f.write(chunk)
+
+        tmp_path = self._write_temp(copy)
+        blob_path = self._blob_path(hasher.hexdigest())
+        self._commit_blob(tmp_path, blob_path)
+        self._link(blob_path, full_path)
+
+    # ─── Content-addressed store ─────────────────────────────────────────
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_path / digest[:2] / digest
+
+    def _write_temp(self, write: Callable[[BinaryIO], None]) -> str:
+        """Write to a temporary file inside the store and return its path."""
+        os.makedirs(self.blob_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path
+
+    @staticmethod
+    def _commit_blob(tmp_path: str, blob_path: Path) -> None:
+        """Rename a finished temp file into place, so a blob is never visible half-written."""
+        if blob_path.exists():
+            # Same digest, same content: keep the blob other keys already link to
+            os.unlink(tmp_path)
+            return
+        os.makedirs(blob_path.parent, exist_ok=True)
+        os.replace(tmp_path, blob_path)
+
+    @staticmethod
+    def _link(blob_path: Path, full_path: Path) -> None:
+        """Point full_path at a blob, replacing any file already stored under the key."""
+        os.makedirs(full_path.parent, exist_ok=True)
+        # Never write through an existing key: it may share its inode with other keys
+        full_path.unlink(missing_ok=True)
+        try:
+            os.link(blob_path, full_path)
+        except OSError as e:
+            if e.errno not in NO_LINK_ERRNOS:
+                raise
+            shutil.copyfile(blob_path, full_path)
+
+    async def prune_blobs(self) -> int:
+        """
+        Delete blobs that no stored key links to any more; returns how many.
+        Walks the whole blob store, so it runs as a maintenance job
+        (python -m app.maintenance prune-blobs), not on startup.
+        """
+        return await asyncio.to_thread(self._prune_blobs)
+
+    def _prune_blobs(self) -> int:
+        cutoff = time.time() - CAS_PRUNE_GRACE_SECONDS
+        pruned = 0
+        for dirpath, _, filenames in os.walk(self.blob_path):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_nlink == 1 and stat.st_mtime < cutoff:
+                        os.unlink(path)
+                        pruned += 1
+                except OSError:
+                    continue
+        return pruned
+
     async def download_image(self, key: str) -> bytes:
         """Read an image from local storage and return bytes."""
         full_path = self._get_full_path(key)
 
-        if not full_path.exists():
-            raise FileNotFoundError(f"File not found: {key}")
-
-        async with aiofiles.open(full_path, "rb") as f:
-            data = await f.read()
-
-        return data
+        # No separate exists() check: the read reports a missing file itself,
+        # saving a blocking stat() on the event loop
+        try:
+            return await self._run(lambda: asyncio.to_thread(full_path.read_bytes))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File not found: {key}") from None
 
     async def get_url(self, key: str) -> str:
         """
         Get a URL/path for accessing the file.
-        For local storage, returns the relative path.
+        For local storage, returns the public base URL when configured,
+        otherwise the relative path served by the API's /files mount.
         In production with S3, this would return a presigned URL.
         """
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
         return f"/files/{key}"
 
     async def delete_image(self, key: str) -> None:
         """Delete an image from local storage."""
         full_path = self._get_full_path(key)
+        await asyncio.to_thread(full_path.unlink, missing_ok=True)
+
+    async def delete_images(self, keys: list[str]) -> None:
+        """Delete many files from local storage; missing or locked files are skipped."""
+        await asyncio.to_thread(self._delete_files, keys)
 
-        if full_path.exists():
-            full_path.unlink()
+    def _delete_files(self, keys: list[str]) -> None:
+        for key in keys:
+            try:
+                self._get_full_path(key).unlink(missing_ok=True)
+            except OSError:
+                continue
 
     async def ensure_storage_exists(self) -> None:
-        """Ensure storage is ready (create directories)."""
-        self._ensure_base_path()
+        """Ensure storage is ready (create directories, move the legacy blob store)."""
+        await asyncio.to_thread(self._make_directories)
+
+    def _make_directories(self) -> None:
+        # Blobs used to live in base_path/cas, inside the public directory.
+        # One rename moves them out; hard links keep every stored key intact.
+        legacy_path = self.base_path / LEGACY_CAS_DIR
+        if legacy_path.is_dir():
+            if self.blob_path.exists():
+                logger.warning(
+                    "Legacy blob store %s is still publicly served; move its "
+                    "contents into %s", legacy_path, self.blob_path,
+                )
+            else:
+                os.makedirs(self.blob_path.parent, exist_ok=True)
+                os.rename(legacy_path, self.blob_path)
+
         # Create subdirectories for users, generated images, videos, and try-ons
-        (self.base_path / "users").mkdir(exist_ok=True)
-        (self.base_path / "generated").mkdir(exist_ok=True)
-        (self.base_path / "videos").mkdir(exist_ok=True)
-        (self.base_path / "tryons").mkdir(exist_ok=True)
+        for name in ("users", "generated", "videos", "tryons"):
+            os.makedirs(self.base_path / name, exist_ok=True)
+        os.makedirs(self.blob_path, exist_ok=True)
 
 
 # Singleton instance
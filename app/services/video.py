@@ -1,33 +1,107 @@
 import io
+import re
+import random
+import hashlib
 import asyncio
-import imghdr
+from functools import lru_cache
 from google import genai
 from google.genai import types
 
 from app.config import get_settings
+from app.services.genai_client import get_genai_client
+from app.services.image_processing import detect_image_mime_type, ensure_api_image_format, run_image_task
 
 settings = get_settings()
 
-# Map imghdr results to MIME types
-MIME_TYPE_MAP = {
-    "jpeg": "image/jpeg",
-    "png": "image/png",
-    "gif": "image/gif",
-    "webp": "image/webp",
-    "bmp": "image/bmp",
+# Scene/movement enhancements for video
+SCENE_ENHANCEMENTS = {
+    "beach": "gentle ocean waves, soft breeze movement, golden hour lighting",
+    "walking": "smooth walking motion, natural gait, subtle environment movement",
+    "dancing": "fluid dance movements, rhythmic motion, dynamic energy",
+    "talking": "natural lip movements, expressive gestures, conversational tone",
+    "sitting": "subtle breathing motion, relaxed posture, ambient environment",
+    "standing": "confident stance, subtle natural movements, professional presence",
+    "running": "dynamic running motion, athletic movement, energetic pace",
+    "cooking": "hands in motion, kitchen activity, steam and movement",
+    "working": "typing or writing motions, focused activity, office ambiance",
+    "nature": "wind through trees, moving clouds, natural ambient motion",
+    "city": "urban activity, passing traffic, city life movement",
 }
 
+CINEMATIC_SUFFIX = "cinematic quality, smooth motion, professional lighting"
+_CINEMATIC_RE = re.compile("cinematic|photorealistic", re.IGNORECASE)
 
-def _detect_mime_type(image_bytes: bytes) -> str:
-    """Detect the MIME type of image bytes."""
-    img_type = imghdr.what(None, h=image_bytes)
-    return MIME_TYPE_MAP.get(img_type, "image/jpeg")
+# Prompt templates per mode; {prompt} is the enhanced user prompt
+TEXT_VIDEO_TEMPLATE = "Cinematic video: {prompt}. Photorealistic, high fidelity."
+PERSONALIZED_VIDEO_TEMPLATE = (
+    "Cinematic video of the person from the reference images: "
+    "{prompt}. Photorealistic, consistent identity throughout."
+)
+IMAGE_VIDEO_TEMPLATE = "Animate this image: {prompt}. Preserve appearance, smooth natural motion."
+
+# One case-insensitive scan; the lookahead also reports overlapping keywords
+_SCENE_RE = re.compile(
+    "(?=(%s))" % "|".join(map(re.escape, SCENE_ENHANCEMENTS)), re.IGNORECASE
+)
+
+
+class VideoGenerationTimeoutError(Exception):
+    """The video operation did not finish within the allowed wait."""
 
 
 def _bytes_to_genai_image(image_bytes: bytes) -> types.Image:
-    """Convert raw image bytes to a Google GenAI Image object with proper mime type."""
-    mime_type = _detect_mime_type(image_bytes)
-    return types.Image(image_bytes=image_bytes, mime_type=mime_type)
+    """Convert API-accepted image bytes to a Google GenAI Image object with proper mime type."""
+    return types.Image(image_bytes=image_bytes, mime_type=detect_image_mime_type(image_bytes))
+
+
+def _build_reference_image(image_bytes: bytes) -> types.VideoGenerationReferenceImage:
+    """Wrap reference image bytes as a Veo asset reference."""
+    return types.VideoGenerationReferenceImage(
+        image=_bytes_to_genai_image(image_bytes), reference_type="asset"
+    )
+
+
+@lru_cache(maxsize=1024)
+def _enhance_video_prompt(user_prompt: str) -> str:
+    """
+    Enhance a user prompt with cinematic and video-specific details.
+    """
+    enhanced_parts = [user_prompt]
+
+    # Add an enhancement for every scene mentioned (e.g. "walking on the
+    # beach" gets both), in the order they appear in the prompt
+    found_scenes = dict.fromkeys(
+        match.group(1).lower() for match in _SCENE_RE.finditer(user_prompt)
+    )
+    enhanced_parts.extend(SCENE_ENHANCEMENTS[scene] for scene in found_scenes)
+
+    # Add cinematic quality, unless the user already asked for it
+    if not _CINEMATIC_RE.search(user_prompt):
+        enhanced_parts.append(CINEMATIC_SUFFIX)
+
+    return ", ".join(enhanced_parts)
+
+
+# One builder per mode, so each call site picks its template up front.
+# Veo 3.1 works best with short, descriptive prompts. Overly verbose
+# or instructional prompts tend to trigger audio safety filters.
+
+@lru_cache(maxsize=1024)
+def _build_text_video_prompt(user_prompt: str) -> str:
+    """Build the prompt for text-to-video without references."""
+    return TEXT_VIDEO_TEMPLATE.format(prompt=_enhance_video_prompt(user_prompt))
+
+
+@lru_cache(maxsize=1024)
+def _build_personalized_video_prompt(user_prompt: str) -> str:
+    """Build the prompt for text-to-video anchored on reference images."""
+    return PERSONALIZED_VIDEO_TEMPLATE.format(prompt=_enhance_video_prompt(user_prompt))
+
+
+@lru_cache(maxsize=1024)
+def _build_image_video_prompt(user_prompt: str) -> str:
+    """Build the prompt for animating an existing image."""
+    return IMAGE_VIDEO_TEMPLATE.format(prompt=_enhance_video_prompt(user_prompt))
 
 
 class VeoVideoService:
@@ -40,100 +114,65 @@ class VeoVideoService:
     """
 
     def __init__(self):
-        self.client = genai.Client(api_key=settings.nano_banana_api_key)
         self.video_model = "veo-3.1-generate-preview"
-        self.poll_interval = 10  # seconds
-
-    def _enhance_video_prompt(self, user_prompt: str) -> str:
-        """
-        Enhance a user prompt with cinematic and video-specific details.
-        """
-        prompt_lower = user_prompt.lower()
-
-        # Scene/movement enhancements for video
-        scene_enhancements = {
-            "beach": "gentle ocean waves, soft breeze movement, golden hour lighting",
-            "walking": "smooth walking motion, natural gait, subtle environment movement",
-            "dancing": "fluid dance movements, rhythmic motion, dynamic energy",
-            "talking": "natural lip movements, expressive gestures, conversational tone",
-            "sitting": "subtle breathing motion, relaxed posture, ambient environment",
-            "standing": "confident stance, subtle natural movements, professional presence",
-            "running": "dynamic running motion, athletic movement, energetic pace",
-            "cooking": "hands in motion, kitchen activity, steam and movement",
-            "working": "typing or writing motions, focused activity, office ambiance",
-            "nature": "wind through trees, moving clouds, natural ambient motion",
-            "city": "urban activity, passing traffic, city life movement",
-        }
-
-        enhanced_parts = [user_prompt]
-
-        # Add scene enhancements
-        for scene, enhancement in scene_enhancements.items():
-            if scene in prompt_lower:
-                enhanced_parts.append(enhancement)
-                break
-
-        # Add cinematic quality
-        enhanced_parts.append("cinematic quality, smooth motion, professional lighting")
-
-        return ", ".join(enhanced_parts)
-
-    def _build_video_prompt(
-        self, user_prompt: str, for_personalization: bool = False
-    ) -> str:
-        """
-        Build a concise prompt optimized for video generation.
-        Veo 3.1 works best with short, descriptive prompts. Overly verbose
-        or instructional prompts tend to trigger audio safety filters.
-        """
-        enhanced_prompt = self._enhance_video_prompt(user_prompt)
-
-        if for_personalization:
-            prompt = (
-                f"Cinematic video of the person from the reference images: "
-                f"{enhanced_prompt}. Photorealistic, consistent identity throughout."
-            )
-        else:
-            prompt = (
-                f"Cinematic video: {enhanced_prompt}. Photorealistic, high fidelity."
-            )
-
-        return prompt
+        # Poll delay (seconds) grows from poll_min by poll_factor up to poll_max:
+        # quick jobs are noticed quickly, long ones are not polled more often
+        self.poll_min = 1.0
+        self.poll_max = 30.0
+        self.poll_factor = 1.5
+        self.max_wait = settings.video_max_wait_seconds
+
+    @property
+    def client(self) -> genai.Client:
+        """Shared GenAI client, created on first use so importing the app stays cheap."""
+        return get_genai_client()
 
     async def _poll_operation(self, operation) -> bytes:
         """
         Poll the operation until video generation is complete.
         Returns the video bytes.
         """
-        while not operation.done:
-            await asyncio.sleep(self.poll_interval)
-            operation = self.client.operations.get(operation)
+        # Resolved once instead of on every poll
+        get_operation = self.client.operations.get
+        poll_factor, poll_max = self.poll_factor, self.poll_max
+
+        delay = self.poll_min
+        try:
+            # A stuck backend job must not keep this request polling forever
+            async with asyncio.timeout(self.max_wait):
+                while not operation.done:
+                    # Jitter keeps concurrent jobs from polling in lockstep
+                    await asyncio.sleep(delay + random.uniform(0, delay * 0.1))
+                    delay = min(delay * poll_factor, poll_max)
+                    operation = await asyncio.to_thread(get_operation, operation)
+        except TimeoutError:
+            raise VideoGenerationTimeoutError(
+                f"Video generation did not finish within {self.max_wait}s (operation {operation.name})"
+            ) from None
 
         # Check for errors in the operation
-        if hasattr(operation, "error") and operation.error:
-            raise Exception(f"Video generation failed: {operation.error}")
+        error = getattr(operation, "error", None)
+        if error:
+            raise Exception(f"Video generation failed: {error}")
 
-        if not operation.response:
+        response = operation.response
+        if not response:
             # Log the full operation for debugging
             raise Exception(
                 f"Video generation failed: No response. Operation: {operation}"
             )
 
-        if not operation.response.generated_videos:
+        if not response.generated_videos:
             raise Exception(
-                f"Video generation failed: No videos generated. Response: {operation.response}"
+                f"Video generation failed: No videos generated. Response: {response}"
             )
 
         # Get the first generated video
-        video = operation.response.generated_videos[0]
-
-        # Download the video
-        self.client.files.download(file=video.video)
+        video = response.generated_videos[0]
 
-        # Read the video bytes
-        video_bytes = video.video.read()
-
-        return video_bytes
+        # Download the video; the SDK returns the bytes (and also caches them
+        # on video.video.video_bytes)
+        return await asyncio.to_thread(self.client.files.download, file=video.video)
 
     async def generate_video_from_text(
         self,
@@ -152,22 +191,26 @@ class VeoVideoService:
         """
         # Build the prompt
         has_references = reference_images is not None and len(reference_images) > 0
-        full_prompt = self._build_video_prompt(
-            prompt, for_personalization=has_references
-        )
+        if has_references:
+            full_prompt = _build_personalized_video_prompt(prompt)
+        else:
+            full_prompt = _build_text_video_prompt(prompt)
 
         if has_references:
-            # Create reference image objects with proper types.Image format
-            reference_image_objects = []
+            # Create reference image objects with proper types.Image format.
+            # The same photo registered twice adds nothing but upload bytes,
+            # so references are deduplicated by content, keeping first-seen order.
+            unique_images: dict[bytes, bytes] = {}
             for img_bytes in reference_images:
-                genai_image = _bytes_to_genai_image(img_bytes)
-                ref_image = types.VideoGenerationReferenceImage(
-                    image=genai_image, reference_type="asset"
-                )
-                reference_image_objects.append(ref_image)
+                unique_images.setdefault(hashlib.blake2b(img_bytes, digest_size=16).digest(), img_bytes)
+            api_images = await asyncio.gather(
+                *(run_image_task(ensure_api_image_format, img) for img in unique_images.values())
+            )
+            reference_image_objects = [_build_reference_image(img_bytes) for img_bytes in api_images]
 
             # Generate video with reference images
-            operation = self.client.models.generate_videos(
+            operation = await asyncio.to_thread(
+                self.client.models.generate_videos,
                 model=self.video_model,
                 prompt=full_prompt,
                 config=types.GenerateVideosConfig(
@@ -176,7 +219,8 @@ class VeoVideoService:
             )
         else:
             # Generate video without reference images
-            operation = self.client.models.generate_videos(
+            operation = await asyncio.to_thread(
+                self.client.models.generate_videos,
                 model=self.video_model,
                 prompt=full_prompt,
             )
@@ -200,14 +244,16 @@ class VeoVideoService:
             Video bytes (MP4 format)
         """
         # Convert to Google GenAI Image with proper mime type
-        genai_image = _bytes_to_genai_image(source_image)
+        genai_image = _bytes_to_genai_image(
+            await run_image_task(ensure_api_image_format, source_image)
+        )
 
         # Build a concise prompt for image-to-video
-        enhanced_prompt = self._enhance_video_prompt(prompt)
-        full_prompt = f"Animate this image: {enhanced_prompt}. Preserve appearance, smooth natural motion."
+        full_prompt = _build_image_video_prompt(prompt)
 
         # Generate video from the image
-        operation = self.client.models.generate_videos(
+        operation = await asyncio.to_thread(
+            self.client.models.generate_videos,
             model=self.video_model,
             prompt=full_prompt,
             image=genai_image,